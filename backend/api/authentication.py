@@ -0,0 +1,150 @@
+import copy
+import hashlib
+from collections import OrderedDict, defaultdict
+from threading import Lock
+from time import monotonic, perf_counter, time_ns
+
+from django.conf import settings
+from django.core.cache import caches
+from foodgram.metrics import counter_totals, registry
+from rest_framework.authentication import TokenAuthentication
+
+
+class TokenCache:
+
+    def __init__(self, maxsize, ttl, shared=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.shared = shared
+        self._entries = OrderedDict()
+        self._user_keys = defaultdict(set)
+        self._lock = Lock()
+
+    @staticmethod
+    def shared_key(key):
+        return 'auth-token:' + hashlib.sha256(key.encode()).hexdigest()
+
+    @staticmethod
+    def revision_key(user_id):
+        return f'auth-token-revision:{user_id}'
+
+    def revision(self, user_id):
+        if self.shared is None:
+            return None
+        return self.shared.get(self.revision_key(user_id))
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > monotonic():
+                    self._entries.move_to_end(key)
+                else:
+                    self._discard(key)
+                    entry = None
+        if entry is not None:
+            _, credentials, revision = entry
+            # Токены могли отозвать в другом процессе: локальная запись
+            # годится, только пока ревизия пользователя не изменилась.
+            if self.revision(credentials[0].pk) == revision:
+                return credentials, 'hits'
+            with self._lock:
+                self._discard(key)
+        if self.shared is not None:
+            credentials = self.shared.get(self.shared_key(key))
+            if credentials is not None:
+                self._store(key, credentials)
+                return credentials, 'shared_hits'
+        return None, 'misses'
+
+    def set(self, key, credentials):
+        self._store(key, credentials)
+        if self.shared is not None:
+            self.shared.set(self.shared_key(key), credentials, self.ttl)
+
+    def invalidate_user(self, user_id, keys=()):
+        with self._lock:
+            keys = set(keys) | self._user_keys.get(user_id, set())
+            for key in keys:
+                self._discard(key)
+        if self.shared is None:
+            return
+        self.shared.set(self.revision_key(user_id), time_ns(), None)
+        if keys:
+            self.shared.delete_many([self.shared_key(key) for key in keys])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._user_keys.clear()
+
+    def record(self, outcome, elapsed):
+        registry.inc('cache_requests_total', cache='auth_token',
+                     result=outcome)
+        registry.inc('cache_lookup_seconds_total', elapsed,
+                     cache='auth_token')
+
+    def _store(self, key, credentials):
+        revision = self.revision(credentials[0].pk)
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (monotonic() + self.ttl, credentials,
+                                  revision)
+            self._user_keys[credentials[0].pk].add(key)
+            while len(self._entries) > self.maxsize:
+                self._discard(next(iter(self._entries)))
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        user_id = entry[1][0].pk
+        keys = self._user_keys.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[user_id]
+
+
+def auth_cache_stats():
+    data = registry.collect()
+    stats = counter_totals(data, 'cache_requests_total', 'result',
+                           cache='auth_token')
+    stats = {field: stats.get(field, 0)
+             for field in ('hits', 'shared_hits', 'misses')}
+    seconds = sum(counter_totals(data, 'cache_lookup_seconds_total', 'cache',
+                                 cache='auth_token').values())
+    lookups = sum(stats.values())
+    return {
+        **stats,
+        'hit_rate': ((stats['hits'] + stats['shared_hits']) / lookups
+                     if lookups else None),
+        'avg_microseconds': seconds * 1_000_000 / lookups if lookups else None,
+    }
+
+
+def create_token_cache():
+    if settings.AUTH_TOKEN_SHARED_CACHE:
+        return TokenCache(settings.AUTH_TOKEN_CACHE_SIZE,
+                          settings.AUTH_TOKEN_CACHE_TTL,
+                          caches[settings.AUTH_TOKEN_SHARED_CACHE])
+    return TokenCache(settings.AUTH_TOKEN_CACHE_SIZE,
+                      min(settings.AUTH_TOKEN_CACHE_TTL,
+                          settings.AUTH_TOKEN_LOCAL_TTL))
+
+
+token_cache = create_token_cache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+
+    def authenticate_credentials(self, key):
+        start = perf_counter()
+        credentials, outcome = token_cache.get(key)
+        if credentials is None:
+            credentials = super().authenticate_credentials(key)
+            token_cache.set(key, credentials)
+        token_cache.record(outcome, perf_counter() - start)
+        user, token = copy.copy(credentials[0]), copy.copy(credentials[1])
+        token.user = user
+        return user, token
@@ -0,0 +1,58 @@
+import threading
+from bisect import bisect_left
+
+from recipes.models import Ingredient
+from recipes.versions import get_version
+
+from .serializers import IngredientSerializer
+
+
+class IngredientIndex:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = (None, (), ())
+
+    def _fresh_state(self):
+        version = get_version(Ingredient)
+        state = self._state
+        if state[0] != version:
+            with self._lock:
+                state = self._state
+                if state[0] != version:
+                    state = self._build(version)
+                    self._state = state
+        return state
+
+    def _build(self, version):
+        items = IngredientSerializer(Ingredient.objects.all(), many=True).data
+        entries = sorted(
+            ((item['name'].casefold(), item['id'], item) for item in items),
+            key=lambda entry: entry[:2],
+        )
+        return (version,
+                tuple(entry[0] for entry in entries),
+                tuple(entry[2] for entry in entries))
+
+    def all(self):
+        return self._fresh_state()[2]
+
+    def search(self, query, limit=None):
+        _, keys, items = self._fresh_state()
+        prefix = query.casefold()
+        results = []
+        position = bisect_left(keys, prefix)
+        while position < len(keys) and keys[position].startswith(prefix):
+            if len(results) == limit:
+                return results
+            results.append(items[position])
+            position += 1
+        for key, item in zip(keys, items):
+            if len(results) == limit:
+                break
+            if prefix in key and not key.startswith(prefix):
+                results.append(item)
+        return results
+
+
+ingredient_index = IngredientIndex()
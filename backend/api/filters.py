@@ -1,21 +1,65 @@
+import threading
+
+from django.db.models import F
 from django_filters.rest_framework import FilterSet, filters
 from recipes.models import Recipe, Tag
-from rest_framework.filters import SearchFilter
+from recipes.search import search_recipes
+from recipes.versions import get_version
+
+
+class TagBits:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = (None, {})
+
+    def get(self):
+        version = get_version(Tag)
+        state = self._state
+        if state[0] != version:
+            with self._lock:
+                state = self._state
+                if state[0] != version:
+                    state = (version, dict(
+                        Tag.objects.values_list('slug', 'bit')))
+                    self._state = state
+        return state[1]
+
+    def mask(self, slugs):
+        bits = self.get()
+        return sum(1 << bits[slug] for slug in set(slugs) if slug in bits)
+
+
+tag_bits = TagBits()
+
+
+def tag_choices():
+    return [(slug, slug) for slug in tag_bits.get()]
 
 
 class RecipeFilter(FilterSet):
     author = filters.NumberFilter(field_name='author__id')
-    tags = filters.ModelMultipleChoiceFilter(field_name='tags__slug',
-                                             to_field_name='slug',
-                                             queryset=Tag.objects.all())
+    tags = filters.MultipleChoiceFilter(choices=tag_choices,
+                                        method='filter_tags')
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart')
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
         fields = ('author', 'tags')
 
+    def filter_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        # Различных масок немного: подзапрос проходит по индексу tags_mask,
+        # а рецепты выбираются по тому же индексу через IN.
+        masks = Recipe.objects.alias(
+            matched_tags=F('tags_mask').bitand(tag_bits.mask(value))
+        ).exclude(matched_tags=0).order_by().values('tags_mask').distinct()
+        return queryset.filter(tags_mask__in=masks)
+
     def filter_is_favorited(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
             return queryset.filter(favorites__user=self.request.user)
@@ -26,6 +70,5 @@ class RecipeFilter(FilterSet):
             return queryset.filter(cart_recipe__user=self.request.user)
         return queryset
 
-
-class IngredientSearchFilter(SearchFilter):
-    search_param = 'name'
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
@@ -0,0 +1,61 @@
+from django.core.cache import cache
+from foodgram.metrics import counter_totals, registry
+from foodgram.middleware import timer
+from recipes.models import Ingredient, Tag
+from recipes.versions import get_version
+
+FRAGMENT_TIMEOUT = 60 * 60 * 24
+USER_FIELDS = ('is_favorited', 'is_in_shopping_cart')
+
+
+def fragment_key(request, recipe, versions):
+    return (f'recipe-fragment:{request.scheme}://{request.get_host()}:'
+            f'{recipe.pk}:{recipe.version}:{versions}')
+
+
+def fragment_stats():
+    results = counter_totals(registry.collect(), 'cache_requests_total',
+                             'result', cache='recipe_fragment')
+    hits, misses = results.get('hits', 0), results.get('misses', 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / total if total else None,
+    }
+
+
+def represent_recipes(serializer, recipes):
+    with timer('fragments'):
+        return build_representation(serializer, recipes)
+
+
+def build_representation(serializer, recipes):
+    request = serializer.context['request']
+    versions = f'{get_version(Tag)}:{get_version(Ingredient)}'
+    keys = [fragment_key(request, recipe, versions) for recipe in recipes]
+    fragments = cache.get_many(keys)
+    hits = len(fragments)
+    missing = {}
+    for key, recipe in zip(keys, recipes):
+        if key not in fragments and key not in missing:
+            missing[key] = serializer.build_fragment(recipe)
+    if missing:
+        cache.set_many(missing, FRAGMENT_TIMEOUT)
+        fragments.update(missing)
+    registry.inc('cache_requests_total', hits, cache='recipe_fragment',
+                 result='hits')
+    registry.inc('cache_requests_total', len(missing),
+                 cache='recipe_fragment', result='misses')
+
+    author_field = serializer.fields['author']
+    representation = []
+    for key, recipe in zip(keys, recipes):
+        data = dict(fragments[key])
+        data['is_favorited'] = serializer.get_is_favorited(recipe)
+        data['is_in_shopping_cart'] = serializer.get_is_in_shopping_cart(
+            recipe)
+        data['author'] = dict(data['author'], is_subscribed=(
+            author_field.get_is_subscribed(recipe.author)))
+        representation.append(data)
+    return representation
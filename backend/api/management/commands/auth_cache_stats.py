@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from foodgram.metrics import registry
+
+from ...authentication import auth_cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Показывает статистику кэша токенов авторизации.'
+
+    def handle(self, *args, **options):
+        if registry.directory is None:
+            raise CommandError('Статистика воркеров недоступна: '
+                               'задайте METRICS_DIR')
+        stats = auth_cache_stats()
+        hit_rate = stats['hit_rate']
+        hit_rate = '-' if hit_rate is None else f'{hit_rate:.1%}'
+        latency = stats['avg_microseconds']
+        latency = '-' if latency is None else f'{latency:.0f} µs'
+        self.stdout.write(
+            f'hits: {stats["hits"]}, shared hits: {stats["shared_hits"]}, '
+            f'misses: {stats["misses"]}, hit rate: {hit_rate}, '
+            f'avg latency: {latency}')
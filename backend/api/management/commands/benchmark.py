@@ -0,0 +1,195 @@
+import json
+import math
+import os
+import tracemalloc
+from contextlib import ExitStack
+from time import perf_counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count
+from django.test import Client
+from foodgram.middleware import QueryCounter
+from recipes.models import Follow, Ingredient, Recipe, ShoppingCart, Tag
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, 'benchmarks',
+                                'baseline.json')
+PERCENTILES = (50, 95, 99)
+ENDPOINTS = {
+    'recipe_list': '/api/recipes/?limit=6',
+    'recipe_list_tags': '/api/recipes/?limit=6&tags={tag}',
+    'recipe_list_favorited': '/api/recipes/?limit=6&is_favorited=1',
+    'recipe_detail': '/api/recipes/{recipe}/',
+    'recipe_feed': '/api/recipes/feed/?limit=6',
+    'subscriptions': '/api/users/subscriptions/?limit=6&recipes_limit=3',
+    'shopping_cart_download': '/api/recipes/download_shopping_cart/',
+    'ingredient_search': '/api/ingredients/?name={ingredient}',
+    'tag_list': '/api/tags/',
+}
+MIN_LATENCY_DELTA_MS = 1.0
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[max(math.ceil(p / 100 * len(values)) - 1, 0)]
+
+
+def fetch(client, path):
+    response = client.get(path)
+    if response.streaming:
+        b''.join(response.streaming_content)
+    return response
+
+
+class Command(BaseCommand):
+    help = ('Измеряет время ответа, число запросов к БД и пиковую память '
+            'эндпоинтов API и сравнивает их с сохранённым базовым уровнем.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--user', type=int, dest='user_id',
+                            help='id пользователя, от имени которого '
+                                 'выполняются запросы')
+        parser.add_argument('--endpoint', action='append', dest='endpoints',
+                            choices=sorted(ENDPOINTS))
+        parser.add_argument('--cold', action='store_true',
+                            help='Очищать кэш перед каждым запросом')
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+        parser.add_argument('--save', action='store_true',
+                            help='Сохранить результаты как базовый уровень')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Допустимое относительное ухудшение')
+        parser.add_argument('--host', default='localhost')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations должно быть больше нуля')
+        user = self.get_user(options['user_id'])
+        token, _ = Token.objects.get_or_create(user=user)
+        client = Client(HTTP_HOST=options['host'],
+                        HTTP_AUTHORIZATION=f'Token {token.key}')
+        params = self.get_params()
+        results = {
+            'dataset': {
+                'users': User.objects.count(),
+                'recipes': Recipe.objects.count(),
+                'follows': Follow.objects.count(),
+                'cold': options['cold'],
+            },
+            'endpoints': {},
+        }
+        for name in options['endpoints'] or ENDPOINTS:
+            path = ENDPOINTS[name].format(**params)
+            result = self.measure(client, path, options)
+            results['endpoints'][name] = result
+            print(f'{name}: status={result["status"]}, '
+                  f'queries={result["queries"]}, '
+                  + ', '.join(f'p{p}={result[f"p{p}_ms"]:.2f}ms'
+                              for p in PERCENTILES)
+                  + f', peak={result["peak_memory_kb"]}KiB')
+        if options['save']:
+            os.makedirs(os.path.dirname(options['baseline']), exist_ok=True)
+            with open(options['baseline'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, indent=2, ensure_ascii=False)
+            print(f'Baseline saved to {options["baseline"]}.')
+            return
+        self.compare(results, options['baseline'], options['tolerance'])
+
+    def get_user(self, user_id):
+        users = User.objects.all()
+        if user_id is None:
+            users = users.filter(
+                pk__in=ShoppingCart.objects.values('user')
+            ).annotate(
+                follows=Count('follower', distinct=True)
+            ).order_by('-follows', 'pk')
+        else:
+            users = users.filter(pk=user_id)
+        user = users.first()
+        if user is None:
+            raise CommandError('Не найден пользователь для запросов, '
+                               'сгенерируйте данные командой '
+                               'generate_dataset')
+        return user
+
+    def get_params(self):
+        tag = Tag.objects.order_by('id').first()
+        recipe = Recipe.objects.order_by('-favorites_count', 'id').first()
+        ingredient = Ingredient.objects.order_by('id').first()
+        if None in (tag, recipe, ingredient):
+            raise CommandError('Нет данных для запросов, сгенерируйте их '
+                               'командой generate_dataset')
+        return {'tag': tag.slug, 'recipe': recipe.pk,
+                'ingredient': ingredient.name[:3]}
+
+    def measure(self, client, path, options):
+        for _ in range(options['warmup']):
+            fetch(client, path)
+        durations, queries = [], []
+        for _ in range(options['iterations']):
+            if options['cold']:
+                cache.clear()
+            counter = QueryCounter()
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(counter))
+                start = perf_counter()
+                response = fetch(client, path)
+                durations.append(perf_counter() - start)
+            queries.append(counter.count)
+        if options['cold']:
+            cache.clear()
+        tracemalloc.start()
+        try:
+            fetch(client, path)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return {
+            'path': path,
+            'status': response.status_code,
+            'queries': percentile(queries, 50),
+            **{f'p{p}_ms': round(percentile(durations, p) * 1000, 3)
+               for p in PERCENTILES},
+            'peak_memory_kb': round(peak / 1024),
+        }
+
+    def compare(self, results, path, tolerance):
+        if not os.path.isfile(path):
+            raise CommandError(f'Не найден базовый уровень {path}, '
+                               f'создайте его с флагом --save')
+        with open(path, encoding='utf-8') as file:
+            baseline = json.load(file)
+        if baseline['dataset'] != results['dataset']:
+            raise CommandError(
+                f'Набор данных отличается от базового: '
+                f'{baseline["dataset"]} != {results["dataset"]}')
+        failures = []
+        for name, result in results['endpoints'].items():
+            expected = baseline['endpoints'].get(name)
+            if expected is None:
+                continue
+            if result['status'] != expected['status']:
+                failures.append(f'{name}: status {result["status"]}, '
+                                f'expected {expected["status"]}')
+            if result['queries'] > expected['queries']:
+                failures.append(f'{name}: {result["queries"]} queries, '
+                                f'baseline {expected["queries"]}')
+            limit = expected['p95_ms'] * (1 + tolerance)
+            if (result['p95_ms'] > limit and result['p95_ms']
+                    - expected['p95_ms'] > MIN_LATENCY_DELTA_MS):
+                failures.append(f'{name}: p95 {result["p95_ms"]:.2f}ms, '
+                                f'baseline {expected["p95_ms"]:.2f}ms')
+            limit = expected['peak_memory_kb'] * (1 + tolerance)
+            if result['peak_memory_kb'] > limit:
+                failures.append(f'{name}: peak {result["peak_memory_kb"]}KiB, '
+                                f'baseline {expected["peak_memory_kb"]}KiB')
+        if failures:
+            raise CommandError('Регрессия производительности:\n'
+                               + '\n'.join(failures))
+        print('No regressions against the baseline.')
@@ -0,0 +1,33 @@
+import json
+
+from django.core.management.base import BaseCommand
+from foodgram.metrics import HISTOGRAMS, quantile, registry
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Command(BaseCommand):
+    help = 'Показывает перцентили времени ответа по маршрутам.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--metric', default='http_request_duration_seconds',
+            choices=sorted(HISTOGRAMS))
+
+    def handle(self, *args, **options):
+        name = options['metric']
+        buckets = HISTOGRAMS[name][0]
+        series = registry.collect()['histograms'].get(name, {})
+        rows = []
+        for key, values in series.items():
+            labels = ' '.join(f'{label}={value}'
+                              for label, value in json.loads(key))
+            rows.append((labels, values['count'], [
+                quantile(buckets, values['buckets'], q) for q in QUANTILES]))
+        if not rows:
+            print('Нет данных.')
+            return
+        for labels, count, values in sorted(rows, key=lambda row: -row[1]):
+            print(f'{labels}: count={count}, ' + ', '.join(
+                f'p{round(q * 100)}={value:.3f}'
+                for q, value in zip(QUANTILES, values)))
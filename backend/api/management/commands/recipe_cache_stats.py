@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+from foodgram.metrics import registry
+
+from ...fragments import fragment_stats
+
+
+class Command(BaseCommand):
+    help = 'Показывает статистику кэша сериализованных рецептов.'
+
+    def handle(self, *args, **options):
+        if registry.directory is None:
+            raise CommandError('Статистика воркеров недоступна: '
+                               'задайте METRICS_DIR')
+        stats = fragment_stats()
+        hit_rate = stats['hit_rate']
+        self.stdout.write(
+            f'hits: {stats["hits"]}, misses: {stats["misses"]}, '
+            f'hit rate: {"-" if hit_rate is None else f"{hit_rate:.1%}"}')
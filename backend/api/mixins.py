@@ -1,31 +1,153 @@
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
-from recipes.models import Recipe
+from django.utils.cache import get_conditional_response
+from recipes.counters import RECIPE_COUNTERS, change_counters
+from recipes.models import Recipe, ShoppingCart, ShoppingListItem
+from recipes.versions import get_version
 from rest_framework.response import Response
-from rest_framework.status import (HTTP_201_CREATED, HTTP_204_NO_CONTENT,
-                                   HTTP_400_BAD_REQUEST)
+from rest_framework.status import (HTTP_200_OK, HTTP_201_CREATED,
+                                   HTTP_204_NO_CONTENT, HTTP_400_BAD_REQUEST)
 
-from .serializers import FavoritesSerializer
+from .resolvers import RECIPE_SHORT_FIELDS
+from .serializers import FavoritesSerializer, RecipeIdsSerializer
+
+
+def insert_links(model, user, recipe_ids):
+    quote = connection.ops.quote_name
+    user_column = model._meta.get_field('user').column
+    recipe_column = model._meta.get_field('recipe').column
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(model._meta.db_table)} '
+            f'({quote(user_column)}, {quote(recipe_column)}) '
+            f'SELECT %s, {quote(Recipe._meta.pk.column)} '
+            f'FROM {quote(Recipe._meta.db_table)} '
+            f'WHERE {quote(Recipe._meta.pk.column)} IN ({placeholders}) '
+            f'ON CONFLICT DO NOTHING RETURNING {quote(recipe_column)}',
+            [user.pk, *recipe_ids])
+        return [recipe_id for recipe_id, in cursor.fetchall()]
+
+
+def delete_links(model, user, recipe_ids=None):
+    quote = connection.ops.quote_name
+    user_column = model._meta.get_field('user').column
+    recipe_column = model._meta.get_field('recipe').column
+    sql = (f'DELETE FROM {quote(model._meta.db_table)} '
+           f'WHERE {quote(user_column)} = %s')
+    params = [user.pk]
+    if recipe_ids is not None:
+        sql += (f' AND {quote(recipe_column)} IN '
+                f'({", ".join(["%s"] * len(recipe_ids))})')
+        params += recipe_ids
+    with connection.cursor() as cursor:
+        cursor.execute(f'{sql} RETURNING {quote(recipe_column)}', params)
+        return [recipe_id for recipe_id, in cursor.fetchall()]
 
 
 class AddDelMixin:
 
+    def change_links(self, model, user, recipe_ids, delta):
+        if not recipe_ids:
+            return
+        change_counters(Recipe, recipe_ids, RECIPE_COUNTERS[model], delta)
+        if model is not ShoppingCart:
+            return
+        if delta > 0:
+            ShoppingListItem.objects.add_recipes(user, recipe_ids)
+        else:
+            ShoppingListItem.objects.remove_recipes(user, recipe_ids)
+
     def create_obj(self, model, user, pk):
-        recipe = get_object_or_404(Recipe, id=pk)
-        if model.objects.filter(user=user, recipe=recipe).exists():
+        with transaction.atomic():
+            created = insert_links(model, user, [pk])
+            self.change_links(model, user, created, 1)
+        recipe = get_object_or_404(
+            Recipe.objects.only(*RECIPE_SHORT_FIELDS), id=pk)
+        if not created:
             return Response(
                 {'errors': f'{recipe.name} '
                            f'уже добавлен в список у {user.username}!'},
                 status=HTTP_400_BAD_REQUEST)
-        model.objects.create(user=user, recipe=recipe)
         serializer = FavoritesSerializer(recipe)
         return Response(serializer.data, status=HTTP_201_CREATED)
 
     def delete_obj(self, model, user, pk):
-        recipe = get_object_or_404(Recipe, id=pk)
-        obj = model.objects.filter(user=user, recipe__id=pk)
-        if obj.exists():
-            obj.delete()
+        with transaction.atomic():
+            deleted = delete_links(model, user, [pk])
+            self.change_links(model, user, deleted, -1)
+        if deleted:
             return Response(status=HTTP_204_NO_CONTENT)
+        recipe = get_object_or_404(Recipe.objects.only('name'), id=pk)
         return Response({
             'errors': f'{recipe.name} не оказалось в списке у {user.username}!'
         }, status=HTTP_400_BAD_REQUEST)
+
+    @transaction.atomic
+    def create_objs(self, model, user, recipe_ids):
+        recipes = Recipe.objects.only(*RECIPE_SHORT_FIELDS).in_bulk(
+            recipe_ids)
+        missing = set(recipe_ids) - recipes.keys()
+        if missing:
+            return Response({'errors': 'Рецепты не найдены: ' + ', '.join(
+                map(str, sorted(missing)))}, status=HTTP_400_BAD_REQUEST)
+        created = insert_links(model, user, recipe_ids)
+        self.change_links(model, user, created, 1)
+        serializer = FavoritesSerializer(
+            [recipes[pk] for pk in recipe_ids], many=True)
+        return Response(serializer.data, status=HTTP_201_CREATED)
+
+    @transaction.atomic
+    def delete_objs(self, model, user, recipe_ids=None):
+        deleted = delete_links(model, user, recipe_ids)
+        self.change_links(model, user, deleted, -1)
+        return Response(status=HTTP_204_NO_CONTENT)
+
+    def add_del_objs(self, model, request):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        if request.method == 'POST':
+            return self.create_objs(model, request.user, recipe_ids)
+        return self.delete_objs(model, request.user, recipe_ids)
+
+
+class VersionedCacheMixin:
+    cache_control = 'public, no-cache'
+    cache_timeout = 60 * 60 * 24
+
+    def list(self, request, *args, **kwargs):
+        return self.versioned_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.versioned_response(super().retrieve, request,
+                                       *args, **kwargs)
+
+    def versioned_response(self, handler, request, *args, **kwargs):
+        renderer = request.accepted_renderer
+        if renderer.format != 'json':
+            return handler(request, *args, **kwargs)
+        version = get_version(self.queryset.model)
+        etag = f'"{version}"'
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            key = f'response:{version}:{request.get_full_path()}'
+            cached = cache.get(key)
+            if cached is None:
+                response = handler(request, *args, **kwargs)
+                if response.status_code != HTTP_200_OK:
+                    return response
+                if response.streaming:
+                    response['ETag'] = etag
+                    response['Cache-Control'] = self.cache_control
+                    return response
+                self.finalize_response(request, response, *args, **kwargs)
+                response.render()
+                cached = (response.content, response['Content-Type'])
+                cache.set(key, cached, self.cache_timeout)
+            response = HttpResponse(cached[0], content_type=cached[1])
+        response['ETag'] = etag
+        response['Cache-Control'] = self.cache_control
+        return response
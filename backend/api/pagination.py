@@ -1,6 +1,131 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from recipes.models import Recipe
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def get_recipes_limit(request):
+    limit = request.GET.get('recipes_limit', '')
+    if not limit.isdigit():
+        return None
+    return min(int(limit), settings.API_MAX_PAGE_SIZE)
 
 
 class CustomListPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_fields = None
+        if self.cursor_query_param in request.query_params:
+            self.cursor_fields = self.get_cursor_fields(queryset)
+        if self.cursor_fields is None:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*(
+            f'-{field.name}' if descending else field.name
+            for field, descending in self.cursor_fields
+        ))
+        cursor = request.query_params[self.cursor_query_param]
+        if cursor:
+            queryset = queryset.filter(self.get_cursor_filter(cursor))
+        results = list(queryset[:page_size + 1])
+        self.has_next = len(results) > page_size
+        self.page_results = results[:page_size]
+        return self.page_results
+
+    def get_paginated_response(self, data):
+        if self.cursor_fields is None:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_cursor_link()),
+            ('results', data),
+        ]))
+
+    def get_cursor_fields(self, queryset):
+        model = queryset.model
+        ordering = list(queryset.query.order_by or model._meta.ordering)
+        if not any(name.lstrip('-') in ('id', 'pk') for name in ordering):
+            descending = bool(ordering) and ordering[-1].startswith('-')
+            ordering.append('-id' if descending else 'id')
+        fields = []
+        for name in ordering:
+            if not isinstance(name, str):
+                return None
+            try:
+                field = model._meta.get_field(name.lstrip('-'))
+            except FieldDoesNotExist:
+                if name.lstrip('-') != 'pk':
+                    return None
+                field = model._meta.pk
+            fields.append((field, name.startswith('-')))
+        return fields
+
+    def get_cursor_filter(self, cursor, names=None):
+        try:
+            raw_values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            values = [field.to_python(value) for (field, _), value
+                      in zip(self.cursor_fields, raw_values, strict=True)]
+        except (binascii.Error, TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if names is None:
+            names = [field.name for field, _ in self.cursor_fields]
+        condition = Q()
+        equal = {}
+        for name, (_, descending), value in zip(
+                names, self.cursor_fields, values):
+            lookup = 'lt' if descending else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def encode_cursor(self, obj):
+        values = [field.value_to_string(obj)
+                  for field, _ in self.cursor_fields]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def get_next_cursor_link(self):
+        if not self.has_next:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(),
+                                 self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param,
+                                   self.encode_cursor(self.page_results[-1]))
+
+
+class FeedPagination(CustomListPagination):
+    cursor_fields = (
+        (Recipe._meta.get_field('pub_date'), True),
+        (Recipe._meta.pk, True),
+    )
+
+    def paginate_sources(self, sources, request):
+        self.request = request
+        page_size = self.get_page_size(request)
+        cursor = request.query_params.get(self.cursor_query_param)
+        rows = set()
+        for queryset, recipe_field in sources:
+            if cursor:
+                queryset = queryset.filter(self.get_cursor_filter(
+                    cursor, ('pub_date', recipe_field)))
+            rows.update(queryset.order_by(
+                '-pub_date', f'-{recipe_field}'
+            ).values_list('pub_date', recipe_field)[:page_size + 1])
+        rows = sorted(rows, reverse=True)[:page_size + 1]
+        self.has_next = len(rows) > page_size
+        self.page_results = [Recipe(pk=recipe_id, pub_date=pub_date)
+                             for pub_date, recipe_id in rows[:page_size]]
+        return [recipe.pk for recipe in self.page_results]
@@ -0,0 +1,61 @@
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from recipes.models import Follow, Recipe
+
+RECIPE_SHORT_FIELDS = ('id', 'name', 'image', 'image_variants_ready',
+                       'cooking_time', 'author_id', 'pub_date')
+
+
+class SubscriptionResolver:
+
+    def __init__(self, user):
+        self.user = user
+        self._author_ids = None
+
+    @classmethod
+    def for_request(cls, request):
+        resolver = getattr(request, '_subscription_resolver', None)
+        if resolver is None:
+            resolver = cls(request.user)
+            request._subscription_resolver = resolver
+        return resolver
+
+    @property
+    def author_ids(self):
+        if self._author_ids is None:
+            self._author_ids = set(Follow.objects.filter(
+                user=self.user).values_list('author_id', flat=True))
+        return self._author_ids
+
+    def is_subscribed(self, author):
+        return author.pk in self.author_ids
+
+
+def recipes_by_author(author_ids, limit=None):
+    grouped = defaultdict(list)
+    if not author_ids:
+        return grouped
+    recipes = Recipe.objects.filter(
+        author_id__in=author_ids).only(*RECIPE_SHORT_FIELDS)
+    if limit is not None and connection.features.supports_over_clause:
+        ranked = recipes.order_by().annotate(recipe_rank=Window(
+            RowNumber(),
+            partition_by=F('author_id'),
+            order_by=F('pub_date').desc(),
+        ))
+        sql, params = ranked.query.sql_with_params()
+        recipes = Recipe.objects.raw(
+            f'SELECT * FROM ({sql}) ranked WHERE recipe_rank <= %s '
+            f'ORDER BY author_id, recipe_rank',
+            (*params, limit),
+        )
+        limit = None
+    for recipe in recipes:
+        grouped[recipe.author_id].append(recipe)
+    if limit is not None:
+        for author_id, author_recipes in grouped.items():
+            grouped[author_id] = author_recipes[:limit]
+    return grouped
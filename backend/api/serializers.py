@@ -1,12 +1,29 @@
+from django.core.files.storage import default_storage
 from django.db import transaction
-from django.shortcuts import get_object_or_404
+from django.db.models import Manager, Prefetch, prefetch_related_objects
+from django.http import Http404
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from drf_extra_fields.fields import Base64ImageField
+from recipes.deletion import handled_writes
+from recipes.feed import schedule_fan_out
+from recipes.images import (VARIANTS, same_content, schedule_variants,
+                            variant_names)
 from recipes.models import (Favorites, Follow, Ingredient, Recipe,
-                            RecipeIngredient, ShoppingCart, Tag)
+                            RecipeIngredient, RecipeTag, ShoppingCart,
+                            ShoppingListItem, Tag, tags_mask)
 from rest_framework import serializers
 from users.models import User
 
+from .fragments import USER_FIELDS, represent_recipes
+from .pagination import get_recipes_limit
+from .resolvers import SubscriptionResolver, recipes_by_author
+
+RECIPE_PREFETCH = (
+    'tags',
+    Prefetch('recipeingredient_set',
+             queryset=RecipeIngredient.objects.select_related('ingredient')),
+)
+
 
 class CustomUserCreateSerializer(UserCreateSerializer):
     class Meta:
@@ -19,7 +36,16 @@ class CustomUserCreateSerializer(UserCreateSerializer):
                   'password',)
 
 
-class UserListSerializer(serializers.ModelSerializer):
+class SubscribedMixin:
+
+    def get_is_subscribed(self, obj):
+        request = self.context['request']
+        if request.auth is None:
+            return False
+        return SubscriptionResolver.for_request(request).is_subscribed(obj)
+
+
+class UserListSerializer(SubscribedMixin, serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
@@ -31,15 +57,8 @@ class UserListSerializer(serializers.ModelSerializer):
                   'last_name',
                   'is_subscribed',)
 
-    def get_is_subscribed(self, obj):
-        if self.context['request'].auth is None:
-            return False
-        user = self.context['request'].user
-        author = get_object_or_404(User, pk=obj.id)
-        return Follow.objects.filter(user=user, author=author).exists()
-
 
-class CustomUserSerializer(UserSerializer):
+class CustomUserSerializer(SubscribedMixin, UserSerializer):
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
@@ -51,13 +70,6 @@ class CustomUserSerializer(UserSerializer):
                   'last_name',
                   'is_subscribed')
 
-    def get_is_subscribed(self, obj):
-        if self.context['request'].auth is None:
-            return False
-        user = self.context['request'].user
-        author = get_object_or_404(User, pk=obj.id)
-        return Follow.objects.filter(user=user, author=author).exists()
-
 
 class TagSerializer(serializers.ModelSerializer):
     class Meta:
@@ -76,8 +88,26 @@ class RecipeIngredientsSerializer(serializers.HyperlinkedModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount',)
 
 
-class BaseRecipeSerializer(serializers.ModelSerializer):
+class ImageVariantsMixin:
+
+    def get_image_variants(self, obj):
+        if not obj.image:
+            return None
+        if obj.image_variants_ready:
+            urls = {variant: default_storage.url(name) for variant, name
+                    in variant_names(obj.image.name).items()}
+        else:
+            urls = dict.fromkeys(VARIANTS, obj.image.url)
+        request = self.context.get('request')
+        if request is None:
+            return urls
+        return {variant: request.build_absolute_uri(url)
+                for variant, url in urls.items()}
+
+
+class BaseRecipeSerializer(ImageVariantsMixin, serializers.ModelSerializer):
     image = Base64ImageField(use_url=True, max_length=None)
+    image_variants = serializers.SerializerMethodField()
     tags = TagSerializer(read_only=True, many=True)
     author = CustomUserSerializer(read_only=True)
     ingredients = RecipeIngredientsSerializer(source='recipeingredient_set',
@@ -85,17 +115,28 @@ class BaseRecipeSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
-    def get_is_in_list(self, model, obj):
+    def get_is_in_list(self, model, obj, annotation):
         if self.context['request'].auth is None:
             return False
+        if hasattr(obj, annotation):
+            return getattr(obj, annotation)
         user = self.context['request'].user
         return model.objects.filter(user=user, recipe=obj).exists()
 
 
+class RecipeListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        if isinstance(data, Manager):
+            data = data.all()
+        return represent_recipes(self.child, list(data))
+
+
 class RecipeSerializer(BaseRecipeSerializer):
 
     class Meta:
         model = Recipe
+        list_serializer_class = RecipeListSerializer
         fields = ('id',
                   'tags',
                   'author',
@@ -104,46 +145,70 @@ class RecipeSerializer(BaseRecipeSerializer):
                   'is_in_shopping_cart',
                   'name',
                   'image',
+                  'image_variants',
                   'text',
                   'cooking_time')
         read_only_fields = ('is_favorite', 'is_shopping_cart')
 
+    def to_representation(self, instance):
+        return represent_recipes(self, [instance])[0]
+
+    def build_fragment(self, instance):
+        prefetch_related_objects([instance], *RECIPE_PREFETCH)
+        data = super().to_representation(instance)
+        for field in USER_FIELDS:
+            data[field] = None
+        data['author']['is_subscribed'] = None
+        return data
+
     def get_is_favorited(self, obj):
-        return self.get_is_in_list(Favorites, obj)
+        return self.get_is_in_list(Favorites, obj, 'is_favorited')
 
     def get_is_in_shopping_cart(self, obj):
-        return self.get_is_in_list(ShoppingCart, obj)
+        return self.get_is_in_list(ShoppingCart, obj,
+                                   'is_in_shopping_cart')
+
+    def get_objects(self, model, ids, duplicate_message):
+        if len(set(ids)) != len(ids):
+            raise serializers.ValidationError(duplicate_message)
+        objects = model.objects.in_bulk(ids)
+        if len(objects) != len(ids):
+            raise Http404
+        return [objects[pk] for pk in ids]
 
     def validate(self, data):
         ingredients = self.initial_data.get('ingredients')
         if not ingredients:
             raise serializers.ValidationError(
                 'Список ингредиентов не должен быть пустым')
-        ingredient_list = []
-        for ingredient in ingredients:
-            ingredient_obj = get_object_or_404(Ingredient,
-                                               id=ingredient['id'])
-            if ingredient_obj in ingredient_list:
-                raise serializers.ValidationError(
-                    'Нельзя добавлять одинаковые ингредиенты')
-            ingredient_list.append(ingredient_obj)
-            if int(ingredient['amount']) <= 0:
-                raise serializers.ValidationError(
-                    'Единица измерения ингредиента должна быть больше 0')
-        data['ingredients'] = ingredients
+        try:
+            ingredient_ids = [int(item['id']) for item in ingredients]
+            amounts = [int(item['amount']) for item in ingredients]
+        except (KeyError, TypeError, ValueError):
+            raise serializers.ValidationError(
+                'Некорректный список ингредиентов')
+        if min(amounts) <= 0:
+            raise serializers.ValidationError(
+                'Единица измерения ингредиента должна быть больше 0')
+        ingredient_objs = self.get_objects(
+            Ingredient, ingredient_ids,
+            'Нельзя добавлять одинаковые ингредиенты')
+        data['ingredients'] = [
+            {'ingredient': ingredient, 'amount': amount}
+            for ingredient, amount in zip(ingredient_objs, amounts)
+        ]
 
         tags = self.initial_data.get('tags')
         if not tags:
             raise serializers.ValidationError({
                 'tags': 'Список тэгов не должен быть пустым'})
-        tag_list = []
-        for tag in tags:
-            tag_obj = get_object_or_404(Tag, id=int(tag))
-            if tag_obj in tag_list:
-                raise serializers.ValidationError(
-                    'Нельзя добавлять одинаковые теги')
-            tag_list.append(tag_obj)
-        data['tags'] = tags
+        try:
+            tag_ids = [int(tag) for tag in tags]
+        except (TypeError, ValueError):
+            raise serializers.ValidationError({
+                'tags': 'Некорректный список тэгов'})
+        data['tags'] = self.get_objects(Tag, tag_ids,
+                                        'Нельзя добавлять одинаковые теги')
 
         return data
 
@@ -153,49 +218,97 @@ class RecipeSerializer(BaseRecipeSerializer):
             raise serializers.ValidationError()
         return data
 
+    def set_ingredients(self, recipe, ingredients):
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe_id=recipe,
+                             ingredient=ingredient['ingredient'],
+                             amount=ingredient['amount'])
+            for ingredient in ingredients
+        )
+
     @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
         user = self.context['request'].user
-        recipe = Recipe.objects.create(author=user, **validated_data)
+        recipe = Recipe.objects.create(author=user, tags_mask=tags_mask(tags),
+                                       **validated_data)
 
         recipe.tags.set(tags)
+        self.set_ingredients(recipe, ingredients)
+        schedule_variants(recipe)
+        schedule_fan_out(recipe)
 
-        for ingredient in ingredients:
-            ingredient_obj = get_object_or_404(Ingredient,
-                                               id=ingredient['id'])
-            RecipeIngredient.objects.get_or_create(
-                recipe_id=recipe,
-                ingredient=ingredient_obj,
-                amount=ingredient['amount']
-            )
-
+        recipe.is_favorited = recipe.is_in_shopping_cart = False
         return recipe
 
+    def update_tags(self, recipe, tags):
+        current = {tag.pk for tag in recipe.tags.all()}
+        new = {tag.pk for tag in tags}
+        if current == new:
+            return False
+        with handled_writes():
+            RecipeTag.objects.filter(recipe=recipe,
+                                     tag_id__in=current - new).delete()
+        RecipeTag.objects.bulk_create(RecipeTag(recipe=recipe, tag_id=pk)
+                                      for pk in new - current)
+        return True
+
+    def update_ingredients(self, recipe, ingredients):
+        current = {item.ingredient_id: item
+                   for item in recipe.recipeingredient_set.all()}
+        old_amounts = {pk: item.amount for pk, item in current.items()}
+        new = {ingredient['ingredient'].pk: ingredient['amount']
+               for ingredient in ingredients}
+        to_delete = [item.pk for pk, item in current.items()
+                     if pk not in new]
+        to_update = []
+        for pk, item in current.items():
+            if pk in new and item.amount != new[pk]:
+                item.amount = new[pk]
+                to_update.append(item)
+        to_create = [
+            RecipeIngredient(recipe_id=recipe, ingredient_id=pk, amount=amount)
+            for pk, amount in new.items() if pk not in current
+        ]
+        if not (to_delete or to_update or to_create):
+            return False
+        with handled_writes():
+            RecipeIngredient.objects.filter(pk__in=to_delete).delete()
+        RecipeIngredient.objects.bulk_update(to_update, ('amount',))
+        RecipeIngredient.objects.bulk_create(to_create)
+        ShoppingListItem.objects.update_recipe(recipe, old_amounts, new)
+        return True
+
     @transaction.atomic
     def update(self, instance, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
-        instance.name = validated_data.get('name')
-        instance.text = validated_data.get('text')
-        instance.image = validated_data.get('image')
-        instance.cooking_time = validated_data.get('cooking_time')
-        instance.save()
-
-        RecipeIngredient.objects.filter(recipe=instance).delete()
-
-        instance.tags.set(tags)
-
-        recipe_ingredients = []
-        for ingredient in ingredients:
-            recipe_ingredients.append(RecipeIngredient(
-                recipe=instance,
-                ingredient=ingredient["id"],
-                amount=ingredient["amount"],
-            ))
-        RecipeIngredient.objects.bulk_create(recipe_ingredients)
-
+        changed_fields = [
+            field for field in ('name', 'text', 'cooking_time')
+            if getattr(instance, field) != validated_data.get(field)
+        ]
+        for field in changed_fields:
+            setattr(instance, field, validated_data.get(field))
+        image = validated_data.get('image')
+        if not same_content(instance.image, image):
+            instance.image = image
+            instance.image_variants_ready = False
+            changed_fields += ['image', 'image_variants_ready']
+
+        tags_changed = self.update_tags(instance, tags)
+        if tags_changed:
+            instance.tags_mask = tags_mask(tags)
+            changed_fields.append('tags_mask')
+        ingredients_changed = self.update_ingredients(instance, ingredients)
+        if changed_fields:
+            instance.save(update_fields=changed_fields)
+            if 'image' in changed_fields:
+                schedule_variants(instance)
+        elif ingredients_changed:
+            instance.bump_version()
+        if tags_changed or ingredients_changed:
+            instance._prefetched_objects_cache = {}
         return instance
 
 
@@ -205,12 +318,24 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit')
 
 
-class FavoritesSerializer(serializers.ModelSerializer):
+class FavoritesSerializer(ImageVariantsMixin, serializers.ModelSerializer):
     image = Base64ImageField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100,
+    )
+
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
 
 
 class FollowSerializer(serializers.ModelSerializer):
@@ -235,16 +360,15 @@ class FollowSerializer(serializers.ModelSerializer):
                   'recipes_count')
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        queryset = Recipe.objects.filter(author=obj.author)
-        if limit:
-            queryset = queryset[:int(limit)]
-        return FavoritesSerializer(queryset, many=True).data
+        recipes = self.context.get('recipes')
+        if recipes is None:
+            recipes = recipes_by_author(
+                [obj.author_id], get_recipes_limit(self.context['request']))
+        return FavoritesSerializer(recipes.get(obj.author_id, []),
+                                   many=True).data
 
     def get_is_subscribed(self, obj):
-        return Follow.objects.filter(user=obj.user,
-                                     author=obj.author).exists()
+        return True
 
     def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj.author).count()
+        return obj.author.recipes_count
@@ -0,0 +1,97 @@
+import csv
+import hashlib
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from django.db.models import Count, Max, Sum
+from django.http import HttpResponse, StreamingHttpResponse
+from recipes.models import ShoppingListItem
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+TITLE = 'Ваш список покупок:'
+CSV_HEADER = ('Ингредиент', 'Количество', 'Единица измерения')
+PDF_FONT_NAME = 'ShoppingCartFont'
+PDF_FONT_SIZE = 12
+PDF_MARGIN = 50
+PDF_LINE_HEIGHT = 18
+
+
+def get_cart_ingredients(user):
+    return ShoppingListItem.objects.filter(user=user).values_list(
+        'ingredient__name', 'ingredient__measurement_unit', 'amount'
+    ).order_by('ingredient__name')
+
+
+def get_cart_etag(user, export_format):
+    state = ShoppingListItem.objects.filter(user=user).aggregate(
+        rows=Count('id'), amount=Sum('amount'), updated=Max('updated'))
+    digest = hashlib.md5(
+        f'{user.pk}:{export_format}:{state["rows"]}:{state["amount"]}:'
+        f'{state["updated"]}'.encode()
+    ).hexdigest()
+    return f'"{digest}"'
+
+
+def iter_txt(rows):
+    yield f'{TITLE}\n\n'
+    for name, unit, total in rows:
+        yield f'{name.capitalize()} - {total} {unit}\n'
+
+
+class Echo:
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for name, unit, total in rows:
+        yield writer.writerow((name.capitalize(), total, unit))
+
+
+@lru_cache(maxsize=None)
+def register_pdf_font():
+    pdfmetrics.registerFont(
+        TTFont(PDF_FONT_NAME, settings.SHOPPING_CART_PDF_FONT))
+    return PDF_FONT_NAME
+
+
+def render_pdf(rows):
+    font = register_pdf_font()
+    buffer = BytesIO()
+    page = canvas.Canvas(buffer, pagesize=A4)
+    _, height = A4
+    y = height - PDF_MARGIN
+    page.setFont(font, PDF_FONT_SIZE)
+    for line in iter_txt(rows):
+        if y < PDF_MARGIN:
+            page.showPage()
+            page.setFont(font, PDF_FONT_SIZE)
+            y = height - PDF_MARGIN
+        page.drawString(PDF_MARGIN, y, line.rstrip('\n'))
+        y -= PDF_LINE_HEIGHT
+    page.save()
+    return buffer.getvalue()
+
+
+def export_shopping_cart(user, renderer):
+    export_format = renderer.format
+    content_type = renderer.media_type
+    if renderer.charset:
+        content_type = f'{content_type}; charset={renderer.charset}'
+    rows = get_cart_ingredients(user).iterator()
+    if export_format == 'pdf':
+        response = HttpResponse(render_pdf(rows), content_type=content_type)
+    else:
+        exporter = iter_csv if export_format == 'csv' else iter_txt
+        response = StreamingHttpResponse(exporter(rows),
+                                         content_type=content_type)
+    filename = f'shopping_cart.{export_format}'
+    response['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
@@ -0,0 +1,23 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_cache
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    token_cache.invalidate_user(instance.user_id, [instance.key])
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_user_tokens(sender, instance, created, update_fields,
+                           **kwargs):
+    if created or (update_fields and update_fields <= {'last_login'}):
+        return
+    keys = ()
+    if token_cache.shared is not None:
+        keys = Token.objects.filter(user=instance).values_list(
+            'key', flat=True)
+    token_cache.invalidate_user(instance.pk, keys)
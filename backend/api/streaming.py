@@ -0,0 +1,37 @@
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import QuerySet
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+CONTENT_TYPE = 'application/json'
+
+
+def chunks(items, size):
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def render_list(items, serialize, chunk_size):
+    encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    separator = b'['
+    for chunk in chunks(items, chunk_size):
+        data = serialize(chunk) if serialize is not None else chunk
+        if not data:
+            continue
+        yield separator + ','.join(map(encoder.encode, data)).encode()
+        separator = b','
+    yield b'[]' if separator == b'[' else b']'
+
+
+def streaming_list_response(items, serialize=None, chunk_size=None):
+    chunk_size = chunk_size or settings.STREAMING_CHUNK_SIZE
+    if isinstance(items, QuerySet):
+        items = items.iterator(chunk_size=chunk_size)
+    return StreamingHttpResponse(render_list(items, serialize, chunk_size),
+                                 content_type=CONTENT_TYPE)
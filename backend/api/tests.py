@@ -0,0 +1,638 @@
+import csv
+import io
+import json
+import os
+import tempfile
+from contextlib import redirect_stdout
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from recipes.counters import reconcile_counters
+from recipes.feed import fan_out_recipe
+from recipes.models import (DataVersion, Favorites, FeedEntry, Follow,
+                            Ingredient, Recipe, RecipeIngredient, RecipeTag,
+                            ShoppingCart, ShoppingListItem, Tag, tags_mask)
+from recipes.versions import get_version
+from rest_framework.authtoken.models import Token
+from rest_framework.status import (HTTP_200_OK, HTTP_201_CREATED,
+                                   HTTP_204_NO_CONTENT, HTTP_304_NOT_MODIFIED,
+                                   HTTP_400_BAD_REQUEST, HTTP_401_UNAUTHORIZED,
+                                   HTTP_404_NOT_FOUND)
+from rest_framework.test import APIClient
+from users.models import User
+
+from .authentication import TokenCache, token_cache
+
+IMAGE = ('data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJ'
+         'AAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg==')
+RECIPES_COUNT = 25
+PAGE_SIZES = (6, 20)
+# count, recipes, tags, ingredients, data versions
+LIST_QUERIES = 5
+# token, count, recipes, tags, ingredients, data versions, subscriptions
+AUTHENTICATED_LIST_QUERIES = 7
+# recipe, tags, ingredients, data versions
+DETAIL_QUERIES = 4
+# token, recipe, tags, ingredients, data versions, subscriptions
+AUTHENTICATED_DETAIL_QUERIES = 6
+
+
+def create_user(name):
+    return User.objects.create_user(
+        email=f'{name}@example.com', username=name, first_name='Имя',
+        last_name='Фамилия', password='password')
+
+
+def response_json(response):
+    if response.streaming:
+        return json.loads(b''.join(response.streaming_content))
+    return response.json()
+
+
+def shopping_list(user):
+    return dict(ShoppingListItem.objects.filter(user=user).values_list(
+        'ingredient_id', 'amount'))
+
+
+class APITestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        cls.author = create_user('author')
+        cls.tags = [Tag.objects.create(name=f'Тег {i}', color=f'#00000{i}',
+                                       slug=f'tag-{i}') for i in range(3)]
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {i}',
+                                      measurement_unit='г')
+            for i in range(4)]
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.client = self.client_for(self.user)
+
+    @staticmethod
+    def client_for(user):
+        client = APIClient()
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def create_recipe(self, author=None, tags=(), amounts=(), name='Рецепт'):
+        recipe = Recipe.objects.create(
+            author=author or self.author, name=name, text='Описание',
+            cooking_time=10)
+        for tag in tags:
+            RecipeTag.objects.create(recipe=recipe, tag=tag)
+        for ingredient, amount in zip(self.ingredients, amounts):
+            RecipeIngredient.objects.create(
+                recipe_id=recipe, ingredient=ingredient, amount=amount)
+        recipe.refresh_from_db()
+        return recipe
+
+    def counters(self):
+        return (
+            list(Recipe.objects.order_by('pk').values_list(
+                'pk', 'favorites_count', 'in_carts_count')),
+            list(User.objects.order_by('pk').values_list(
+                'pk', 'recipes_count', 'followers_count')),
+        )
+
+    def assert_counters_consistent(self):
+        current = self.counters()
+        reconcile_counters()
+        self.assertEqual(current, self.counters())
+
+    def assert_shopping_list_consistent(self, user):
+        current = shopping_list(user)
+        ShoppingListItem.objects.rebuild()
+        self.assertEqual(current, shopping_list(user))
+
+
+class RecipeQueriesTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        cls.token = Token.objects.create(user=cls.user)
+        authors = [create_user(f'author{i}') for i in range(3)]
+        tags = [Tag.objects.create(name=f'Тег {i}', color=f'#00000{i}',
+                                   slug=f'tag-{i}') for i in range(3)]
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(5))
+        ingredients = list(Ingredient.objects.all())
+        get_version(Ingredient)
+        for i in range(RECIPES_COUNT):
+            recipe = Recipe.objects.create(
+                author=authors[i % len(authors)], name=f'Рецепт {i}',
+                text='Описание', cooking_time=10,
+                tags_mask=tags_mask(tags[:2]))
+            RecipeTag.objects.bulk_create(
+                RecipeTag(recipe=recipe, tag=tag) for tag in tags[:2])
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe_id=recipe, ingredient=ingredient,
+                                 amount=i + 1)
+                for ingredient in ingredients[:3])
+            if i % 2:
+                Favorites.objects.create(user=cls.user, recipe=recipe)
+                ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+                cls.recipe = recipe
+
+    def get(self, url, queries, authenticated=False):
+        cache.clear()
+        token_cache.clear()
+        client = APIClient()
+        if authenticated:
+            client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        with self.assertNumQueries(queries):
+            response = client.get(url)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        return response.json()
+
+    def test_recipe_list(self):
+        for authenticated, queries in ((False, LIST_QUERIES),
+                                       (True, AUTHENTICATED_LIST_QUERIES)):
+            for limit in PAGE_SIZES:
+                with self.subTest(authenticated=authenticated, limit=limit):
+                    data = self.get(f'/api/recipes/?limit={limit}', queries,
+                                    authenticated)
+                    self.assertEqual(len(data['results']), limit)
+                    self.assertTrue(all(
+                        len(recipe['ingredients']) == 3
+                        and len(recipe['tags']) == 2
+                        for recipe in data['results']))
+
+    def test_recipe_detail(self):
+        url = f'/api/recipes/{self.recipe.pk}/'
+        data = self.get(url, DETAIL_QUERIES)
+        self.assertFalse(data['is_favorited'])
+        data = self.get(url, AUTHENTICATED_DETAIL_QUERIES, authenticated=True)
+        self.assertTrue(data['is_favorited'])
+        self.assertTrue(data['is_in_shopping_cart'])
+
+
+class ShoppingListTest(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.create_recipe(amounts=(5, 10))
+        self.client.post(f'/api/recipes/{self.recipe.pk}/shopping_cart/')
+
+    def test_add_and_remove_recipe(self):
+        first, second = self.ingredients[:2]
+        self.assertEqual(shopping_list(self.user), {first.pk: 5,
+                                                    second.pk: 10})
+        other = self.create_recipe(amounts=(1,))
+        self.client.post('/api/recipes/shopping_cart/',
+                         {'recipes': [other.pk]}, format='json')
+        self.assertEqual(shopping_list(self.user), {first.pk: 6,
+                                                    second.pk: 10})
+        self.client.delete(f'/api/recipes/{self.recipe.pk}/shopping_cart/')
+        self.assertEqual(shopping_list(self.user), {first.pk: 1})
+        self.client.delete('/api/recipes/clear_shopping_cart/')
+        self.assertEqual(shopping_list(self.user), {})
+
+    def test_recipe_ingredient_changed_outside_api(self):
+        item = RecipeIngredient.objects.get(
+            recipe_id=self.recipe, ingredient=self.ingredients[0])
+        item.amount = 50
+        item.save()
+        RecipeIngredient.objects.create(
+            recipe_id=self.recipe, ingredient=self.ingredients[2], amount=3)
+        RecipeIngredient.objects.filter(
+            recipe_id=self.recipe, ingredient=self.ingredients[1]).delete()
+        self.assertEqual(shopping_list(self.user), {
+            self.ingredients[0].pk: 50, self.ingredients[2].pk: 3})
+        self.assert_shopping_list_consistent(self.user)
+
+    def test_recipe_deleted(self):
+        self.recipe.delete()
+        self.assertEqual(shopping_list(self.user), {})
+        self.assert_shopping_list_consistent(self.user)
+
+    def test_author_deleted(self):
+        self.author.delete()
+        self.assertEqual(shopping_list(self.user), {})
+
+
+class VersionedCacheTest(APITestCase):
+
+    def test_not_modified(self):
+        for url in ('/api/tags/', '/api/ingredients/',
+                    f'/api/tags/{self.tags[0].pk}/'):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, HTTP_200_OK)
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(response.status_code, HTTP_304_NOT_MODIFIED)
+
+    def test_changed_in_this_process(self):
+        etag = self.client.get('/api/tags/')['ETag']
+        Tag.objects.create(name='Новый', color='#000009', slug='new')
+        response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('new', [tag['slug'] for tag in response.json()])
+
+    def test_changed_in_another_process(self):
+        etag = self.client.get('/api/ingredients/')['ETag']
+        Ingredient.objects.bulk_create(
+            [Ingredient(name='Новый', measurement_unit='г')])
+        DataVersion.objects.filter(label='recipes.ingredient').update(
+            version=F('version') + 1)
+        response = self.client.get('/api/ingredients/',
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertIn('Новый',
+                      [item['name'] for item in response_json(response)])
+        response = self.client.get('/api/ingredients/?name=Нов')
+        self.assertEqual([item['name'] for item in response.json()],
+                         ['Новый'])
+
+
+class RecipeFragmentTest(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.create_recipe(tags=self.tags[:1], amounts=(5,))
+        self.url = f'/api/recipes/{self.recipe.pk}/'
+        self.client.get(self.url)
+
+    def test_ingredient_changed_outside_api(self):
+        item = RecipeIngredient.objects.get(recipe_id=self.recipe)
+        item.amount = 50
+        item.save()
+        RecipeIngredient.objects.create(
+            recipe_id=self.recipe, ingredient=self.ingredients[1], amount=7)
+        amounts = {item['id']: item['amount']
+                   for item in self.client.get(self.url).json()['ingredients']}
+        self.assertEqual(amounts, {self.ingredients[0].pk: 50,
+                                   self.ingredients[1].pk: 7})
+        RecipeIngredient.objects.filter(
+            recipe_id=self.recipe, ingredient=self.ingredients[0]).delete()
+        ingredients = self.client.get(self.url).json()['ingredients']
+        self.assertEqual([item['id'] for item in ingredients],
+                         [self.ingredients[1].pk])
+
+    def test_tags_changed_outside_api(self):
+        RecipeTag.objects.create(recipe=self.recipe, tag=self.tags[1])
+        tags = self.client.get(self.url).json()['tags']
+        self.assertEqual({tag['id'] for tag in tags},
+                         {self.tags[0].pk, self.tags[1].pk})
+        RecipeTag.objects.filter(recipe=self.recipe,
+                                 tag=self.tags[0]).delete()
+        tags = self.client.get(self.url).json()['tags']
+        self.assertEqual([tag['id'] for tag in tags], [self.tags[1].pk])
+
+    def test_tag_deleted(self):
+        self.tags[0].delete()
+        self.assertEqual(self.client.get(self.url).json()['tags'], [])
+
+
+class CountersTest(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.create_recipe(amounts=(5,))
+
+    def test_api(self):
+        url = f'/api/recipes/{self.recipe.pk}'
+        self.client.post(f'{url}/favorite/')
+        self.client.post(f'{url}/shopping_cart/')
+        self.client.post(f'/api/users/{self.author.pk}/subscribe/')
+        response = self.client.post('/api/recipes/', {
+            'ingredients': [{'id': self.ingredients[0].pk, 'amount': 1}],
+            'tags': [self.tags[0].pk], 'image': IMAGE, 'name': 'Новый',
+            'text': 'Описание', 'cooking_time': 5}, format='json')
+        self.assertEqual(response.status_code, HTTP_201_CREATED)
+        self.recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.user.refresh_from_db()
+        self.assertEqual(
+            (self.recipe.favorites_count, self.recipe.in_carts_count), (1, 1))
+        self.assertEqual(
+            (self.author.recipes_count, self.author.followers_count), (1, 1))
+        self.assertEqual(self.user.recipes_count, 1)
+        self.assert_counters_consistent()
+        self.client.delete(f'{url}/favorite/')
+        self.client.delete(f'{url}/shopping_cart/')
+        self.client.delete(f'/api/users/{self.author.pk}/subscribe/')
+        self.client.delete(f'/api/recipes/{response.json()["id"]}/')
+        self.assert_counters_consistent()
+
+    def test_created_and_deleted_outside_api(self):
+        Favorites.objects.create(user=self.user, recipe=self.recipe)
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipe)
+        Follow.objects.create(user=self.user, author=self.author)
+        other = self.create_recipe(author=self.user)
+        self.assert_counters_consistent()
+        self.assertEqual(shopping_list(self.user),
+                         {self.ingredients[0].pk: 5})
+        Favorites.objects.all().delete()
+        ShoppingCart.objects.all().delete()
+        Follow.objects.all().delete()
+        other.delete()
+        self.assert_counters_consistent()
+        self.assertEqual(shopping_list(self.user), {})
+
+    def test_user_deleted(self):
+        Favorites.objects.create(user=self.user, recipe=self.recipe)
+        Follow.objects.create(user=self.user, author=self.author)
+        self.user.delete()
+        self.assert_counters_consistent()
+
+
+class ListLinksTest(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.recipes = [
+            self.create_recipe(amounts=(i + 1,), name=f'Рецепт {i}')
+            for i in range(3)]
+
+    def test_add_twice(self):
+        url = f'/api/recipes/{self.recipes[0].pk}/favorite/'
+        self.assertEqual(self.client.post(url).status_code, HTTP_201_CREATED)
+        self.assertEqual(self.client.post(url).status_code,
+                         HTTP_400_BAD_REQUEST)
+        self.recipes[0].refresh_from_db()
+        self.assertEqual(self.recipes[0].favorites_count, 1)
+        self.assertEqual(self.client.delete(url).status_code,
+                         HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.delete(url).status_code,
+                         HTTP_400_BAD_REQUEST)
+        self.assert_counters_consistent()
+
+    def test_missing_recipe(self):
+        missing = max(recipe.pk for recipe in self.recipes) + 1
+        for method in (self.client.post, self.client.delete):
+            self.assertEqual(
+                method(f'/api/recipes/{missing}/shopping_cart/').status_code,
+                HTTP_404_NOT_FOUND)
+        response = self.client.post(
+            '/api/recipes/shopping_cart/',
+            {'recipes': [self.recipes[0].pk, missing]}, format='json')
+        self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
+        self.assertFalse(ShoppingCart.objects.exists())
+        self.assertEqual(shopping_list(self.user), {})
+
+    def test_bulk(self):
+        first, second, third = (recipe.pk for recipe in self.recipes)
+        self.client.post(f'/api/recipes/{first}/shopping_cart/')
+        response = self.client.post(
+            '/api/recipes/shopping_cart/',
+            {'recipes': [first, second, third]}, format='json')
+        self.assertEqual(response.status_code, HTTP_201_CREATED)
+        self.assertEqual([item['id'] for item in response.json()],
+                         [first, second, third])
+        self.assertEqual(shopping_list(self.user),
+                         {self.ingredients[0].pk: 6})
+        self.assert_counters_consistent()
+        response = self.client.delete(
+            '/api/recipes/shopping_cart/',
+            {'recipes': [first, third]}, format='json')
+        self.assertEqual(response.status_code, HTTP_204_NO_CONTENT)
+        self.assertEqual(shopping_list(self.user),
+                         {self.ingredients[0].pk: 2})
+        self.assert_counters_consistent()
+        self.client.delete('/api/recipes/clear_shopping_cart/')
+        self.assertEqual(shopping_list(self.user), {})
+        self.assert_counters_consistent()
+
+
+class TokenInvalidationTest(APITestCase):
+
+    def test_logout(self):
+        self.assertEqual(self.client.get('/api/users/me/').status_code,
+                         HTTP_200_OK)
+        response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.get('/api/users/me/').status_code,
+                         HTTP_401_UNAUTHORIZED)
+
+    def test_revoked_in_another_process(self):
+        token = Token.objects.get(user=self.user)
+        first, second = TokenCache(10, 60, cache), TokenCache(10, 60, cache)
+        first.set(token.key, (self.user, token))
+        self.assertEqual(second.get(token.key)[1], 'shared_hits')
+        self.assertEqual(second.get(token.key)[1], 'hits')
+        first.invalidate_user(self.user.pk)
+        self.assertEqual(second.get(token.key), (None, 'misses'))
+
+
+@override_settings(FEED_FANOUT_LIMIT=1, FEED_BACKFILL_SIZE=2)
+class FeedTest(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.popular = create_user('popular')
+        Follow.objects.create(user=self.author, author=self.popular)
+        for author in (self.author, self.popular):
+            self.client.post(f'/api/users/{author.pk}/subscribe/')
+            for i in range(4):
+                recipe = self.create_recipe(author=author, name=f'Рецепт {i}')
+                fan_out_recipe(recipe.pk)
+
+    def read_feed(self, url):
+        recipe_ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, HTTP_200_OK)
+            self.assertNotIn('count', response.json())
+            recipe_ids += [item['id'] for item in response.json()['results']]
+            url = response.json()['next']
+        return recipe_ids
+
+    def test_cursor_pages(self):
+        entries = FeedEntry.objects.count()
+        expected = list(Recipe.objects.order_by(
+            '-pub_date', '-id').values_list('id', flat=True))
+        self.assertEqual(self.read_feed('/api/recipes/feed/?limit=3'),
+                         expected)
+        self.assertEqual(FeedEntry.objects.count(), entries)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/recipes/feed/?cursor=invalid')
+        self.assertEqual(response.status_code, HTTP_404_NOT_FOUND)
+
+
+class TagFilterTest(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        first, second, third = self.tags
+        self.recipes = {
+            'first': self.create_recipe(tags=(first,)),
+            'both': self.create_recipe(tags=(first, second)),
+            'third': self.create_recipe(tags=(third,)),
+            'none': self.create_recipe(),
+        }
+
+    def filter(self, *slugs):
+        query = '&'.join(f'tags={slug}' for slug in slugs)
+        response = self.client.get(f'/api/recipes/?{query}&limit=20')
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        return {item['id'] for item in response.json()['results']}
+
+    def ids(self, *names):
+        return {self.recipes[name].pk for name in names}
+
+    def test_filter(self):
+        self.assertEqual(self.filter('tag-0'), self.ids('first', 'both'))
+        self.assertEqual(self.filter('tag-1', 'tag-2'),
+                         self.ids('both', 'third'))
+        self.assertEqual(self.filter(), self.ids(*self.recipes))
+
+    def test_recipe_tags_changed_outside_api(self):
+        RecipeTag.objects.create(recipe=self.recipes['none'],
+                                 tag=self.tags[1])
+        RecipeTag.objects.filter(recipe=self.recipes['both'],
+                                 tag=self.tags[1]).delete()
+        self.assertEqual(self.filter('tag-1'), self.ids('none'))
+        for recipe in Recipe.objects.all():
+            self.assertEqual(recipe.tags_mask, tags_mask(recipe.tags.all()))
+
+    def test_bit_taken_concurrently(self):
+        stale = list(Tag.objects.values_list('bit', flat=True))
+        Tag.objects.bulk_create([Tag(name='Чужой', color='#000009',
+                                     slug='other', bit=max(stale) + 1)])
+        values_list = Tag.objects.values_list
+        with mock.patch.object(Tag.objects, 'values_list', side_effect=[
+                stale, values_list('bit', flat=True)]):
+            tag = Tag.objects.create(name='Новый', color='#000008',
+                                     slug='new')
+        self.assertEqual(tag.bit, max(stale) + 2)
+
+
+@override_settings(QUERY_INSPECTION_ENABLED=1, QUERY_INSPECTION_SAMPLE_RATE=1)
+class ServerTimingTest(APITestCase):
+
+    def test_serialize_timing(self):
+        for url in ('/api/tags/', '/api/users/', '/api/recipes/'):
+            timings = self.client.get(url)['Server-Timing']
+            self.assertIn('serialize;dur=', timings)
+
+
+class BenchmarkCommandTest(TestCase):
+
+    def test_iterations_must_be_positive(self):
+        for iterations in (0, -1):
+            with self.assertRaises(CommandError):
+                call_command('benchmark', iterations=iterations)
+
+
+class LargeListTest(APITestCase):
+
+    def test_streamed_ingredient_list(self):
+        response = self.client.get('/api/ingredients/')
+        self.assertTrue(response.streaming)
+        self.assertEqual(
+            response_json(response),
+            [{'id': ingredient.pk, 'name': ingredient.name,
+              'measurement_unit': ingredient.measurement_unit}
+             for ingredient in self.ingredients])
+
+    def test_subscription_recipes_limit(self):
+        for i in range(3):
+            self.create_recipe(name=f'Рецепт {i}')
+        self.client.post(f'/api/users/{self.author.pk}/subscribe/')
+        for query, count in (('', 3), ('?recipes_limit=abc', 3),
+                             ('?recipes_limit=2', 2)):
+            with self.subTest(query=query):
+                response = self.client.get(
+                    f'/api/users/subscriptions/{query}')
+                self.assertEqual(
+                    len(response.json()['results'][0]['recipes']), count)
+
+
+class IsSubscribedTest(APITestCase):
+
+    def subscribed(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        return {user['id']: user['is_subscribed']
+                for user in response.json()['results']}
+
+    def test_user_list(self):
+        self.client.post(f'/api/users/{self.author.pk}/subscribe/')
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.subscribed('/api/users/?limit=20'), {
+                self.user.pk: False, self.author.pk: True})
+        others = [create_user(f'user{i}') for i in range(5)]
+        Follow.objects.create(user=self.user, author=others[0])
+        with CaptureQueriesContext(connection) as many:
+            subscribed = self.subscribed('/api/users/?limit=20')
+        self.assertEqual(len(many), len(few))
+        self.assertEqual({pk for pk, value in subscribed.items() if value},
+                         {self.author.pk, others[0].pk})
+
+    def test_user_detail(self):
+        self.client.post(f'/api/users/{self.author.pk}/subscribe/')
+        for url, expected in ((f'/api/users/{self.author.pk}/', True),
+                              ('/api/users/me/', False)):
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.client.get(url).json()['is_subscribed'], expected)
+        self.assertFalse(APIClient().get(
+            f'/api/users/{self.author.pk}/').json()['is_subscribed'])
+
+
+class CursorPaginationTest(APITestCase):
+
+    def read_pages(self, url):
+        ids = []
+        while url:
+            data = self.client.get(url).json()
+            self.assertNotIn('count', data)
+            ids += [item['id'] for item in data['results']]
+            url = data['next']
+        return ids
+
+    def test_recipes(self):
+        for i in range(5):
+            self.create_recipe(name=f'Рецепт {i}')
+        self.assertEqual(
+            self.read_pages('/api/recipes/?cursor=&limit=2'),
+            list(Recipe.objects.order_by('-pub_date', '-id').values_list(
+                'id', flat=True)))
+
+    def test_users(self):
+        for i in range(3):
+            create_user(f'user{i}')
+        self.assertEqual(self.read_pages('/api/users/?cursor=&limit=2'),
+                         self.read_pages('/api/users/?cursor=&limit=10'))
+        self.assertEqual(
+            len(self.read_pages('/api/users/?cursor=&limit=2')), 5)
+
+
+class LoaderTest(TestCase):
+
+    def load(self, path):
+        with redirect_stdout(io.StringIO()):
+            call_command('loader', path)
+
+    def test_idempotent(self):
+        rows = [('соль', 'г'), ('сахар', 'г'), ('соль', 'г'),
+                ('соль', 'щепотка')]
+        with tempfile.TemporaryDirectory() as directory:
+            csv_path = os.path.join(directory, 'ingredients.csv')
+            with open(csv_path, 'w', encoding='utf-8', newline='') as file:
+                csv.writer(file).writerows(rows)
+            json_path = os.path.join(directory, 'ingredients.json')
+            with open(json_path, 'w', encoding='utf-8') as file:
+                json.dump([{'name': name, 'measurement_unit': unit}
+                           for name, unit in rows], file, ensure_ascii=False)
+            for path in (csv_path, json_path, csv_path):
+                self.load(path)
+        self.assertEqual(
+            sorted(Ingredient.objects.values_list(
+                'name', 'measurement_unit')),
+            sorted(set(rows)))
@@ -1,10 +1,13 @@
-from django.db.models import Sum
-from django.http.response import HttpResponse
+from django.db import transaction
+from django.db.models import Exists, OuterRef
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.serializers import SetPasswordSerializer
+from recipes.deletion import delete_recipes
+from recipes.feed import backfill_feed, feed_sources, prune_feed
 from recipes.models import (Favorites, Follow, Ingredient, Recipe,
-                            RecipeIngredient, ShoppingCart, Tag)
+                            ShoppingCart, Tag)
 from rest_framework import generics, permissions, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -12,13 +15,20 @@ from rest_framework.status import (HTTP_201_CREATED, HTTP_204_NO_CONTENT,
                                    HTTP_400_BAD_REQUEST)
 from users.models import User
 
-from .filters import IngredientSearchFilter, RecipeFilter
-from .mixins import AddDelMixin
-from .pagination import CustomListPagination
+from .autocomplete import ingredient_index
+from .filters import RecipeFilter
+from .mixins import AddDelMixin, VersionedCacheMixin
+from .pagination import CustomListPagination, FeedPagination, get_recipes_limit
 from .permissions import AuthorOrReadOnly
-from .serializers import (CustomUserCreateSerializer, CustomUserSerializer,
-                          FollowSerializer, IngredientSerializer,
-                          RecipeSerializer, TagSerializer)
+from .renderers import (ShoppingCartCSVRenderer, ShoppingCartPDFRenderer,
+                        ShoppingCartTextRenderer)
+from .resolvers import recipes_by_author
+from .serializers import (RECIPE_PREFETCH, CustomUserCreateSerializer,
+                          CustomUserSerializer, FollowSerializer,
+                          IngredientSerializer, RecipeSerializer,
+                          TagSerializer)
+from .shopping_cart import export_shopping_cart, get_cart_etag
+from .streaming import streaming_list_response
 
 
 class BaseRecipeViewSet(viewsets.ModelViewSet, AddDelMixin):
@@ -29,6 +39,22 @@ class BaseRecipeViewSet(viewsets.ModelViewSet, AddDelMixin):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        queryset = Recipe.objects.select_related('author').prefetch_related(
+            *RECIPE_PREFETCH)
+        if self.request.auth is None:
+            return queryset
+        user = self.request.user
+        return queryset.annotate(
+            is_favorited=Exists(Favorites.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+        )
+
+    def perform_destroy(self, instance):
+        delete_recipes([instance])
+
     def add_del_obj(self, model, request, pk=None):
         if request.method == 'POST':
             return self.create_obj(model, request.user, pk)
@@ -37,7 +63,7 @@ class BaseRecipeViewSet(viewsets.ModelViewSet, AddDelMixin):
         return None
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(VersionedCacheMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (permissions.AllowAny,)
@@ -55,24 +81,48 @@ class RecipeViewSet(BaseRecipeViewSet):
     def shopping_cart(self, request, pk=None):
         return self.add_del_obj(ShoppingCart, request, pk)
 
+    @action(detail=False, methods=['post', 'delete'], url_path='favorite',
+            url_name='favorite-bulk',
+            permission_classes=[permissions.IsAuthenticated])
+    def favorite_bulk(self, request):
+        return self.add_del_objs(Favorites, request)
+
+    @action(detail=False, methods=['post', 'delete'],
+            url_path='shopping_cart', url_name='shopping-cart-bulk',
+            permission_classes=[permissions.IsAuthenticated])
+    def shopping_cart_bulk(self, request):
+        return self.add_del_objs(ShoppingCart, request)
+
+    @action(detail=False, methods=['delete'],
+            url_path='clear_shopping_cart',
+            permission_classes=[permissions.IsAuthenticated])
+    def clear_shopping_cart(self, request):
+        return self.delete_objs(ShoppingCart, request.user)
+
+    @action(detail=False, permission_classes=[permissions.IsAuthenticated],
+            pagination_class=FeedPagination)
+    def feed(self, request):
+        recipe_ids = self.paginator.paginate_sources(
+            feed_sources(request.user), request)
+        recipes = self.get_queryset().in_bulk(recipe_ids)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in recipe_ids if pk in recipes], many=True)
+        return self.get_paginated_response(serializer.data)
+
     @action(
         detail=False, url_path='download_shopping_cart',
-        permission_classes=[permissions.IsAuthenticated])
+        permission_classes=[permissions.IsAuthenticated],
+        renderer_classes=[ShoppingCartTextRenderer, ShoppingCartCSVRenderer,
+                          ShoppingCartPDFRenderer])
     def download_shopping_cart(self, request):
         user = request.user
-        ingredients = RecipeIngredient.objects.filter(
-            recipe_id__cart_recipe__user=user).values_list(
-            'ingredient__name',
-            'ingredient__measurement_unit').annotate(Sum('amount'))
-        shopping_cart = 'Ваш список покупок:\n\n'
-        for ingredient in ingredients:
-            shopping_cart += (
-                f'{ingredient[0].capitalize()}'
-                f' - {ingredient[2]} {ingredient[1]}\n'
-            )
-        filename = "shopping_cart.txt"
-        response = HttpResponse(shopping_cart, content_type='text/plain')
-        response['Content-Disposition'] = f'attachment; filename={filename}'
+        renderer = request.accepted_renderer
+        etag = get_cart_etag(user, renderer.format)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = export_shopping_cart(user, renderer)
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
         return response
 
 
@@ -110,7 +160,10 @@ class CustomUserViewSet(viewsets.ModelViewSet):
                     {'errors': 'Нельзя подписаться на самого себя'},
                     status=HTTP_400_BAD_REQUEST
                 )
-            follow = Follow.objects.create(user=request.user, author=author)
+            with transaction.atomic():
+                follow = Follow.objects.create(user=request.user,
+                                               author=author)
+                backfill_feed(request.user, author)
             serializer = FollowSerializer(follow,
                                           context={'request': request})
             return Response(serializer.data, status=HTTP_201_CREATED)
@@ -119,7 +172,9 @@ class CustomUserViewSet(viewsets.ModelViewSet):
             author = get_object_or_404(User, id=pk)
             obj = Follow.objects.filter(user=request.user, author__id=pk)
             if obj.exists():
-                obj.delete()
+                with transaction.atomic():
+                    obj.delete()
+                    prune_feed(request.user, author)
                 return Response(status=HTTP_204_NO_CONTENT)
             return Response(
                 {'errors': f'{request.user.username} '
@@ -136,7 +191,7 @@ class CustomUserViewSet(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
 
         self.request.user.set_password(serializer.data["new_password"])
-        self.request.user.save()
+        self.request.user.save(update_fields=['password'])
 
         return Response(status=HTTP_204_NO_CONTENT)
 
@@ -145,12 +200,15 @@ class CustomUserViewSet(viewsets.ModelViewSet):
             serializer_class=FollowSerializer)
     def subscriptions(self, request):
         user = request.user
-        queryset = Follow.objects.filter(user=user)
+        queryset = Follow.objects.filter(user=user).select_related(
+            'author').order_by('-id')
         pages = self.paginate_queryset(queryset)
+        recipes = recipes_by_author([follow.author_id for follow in pages],
+                                    get_recipes_limit(request))
         serializer = FollowSerializer(
             pages,
             many=True,
-            context={'request': request}
+            context={'request': request, 'recipes': recipes}
         )
         return self.get_paginated_response(serializer.data)
 
@@ -161,9 +219,21 @@ class UserDetail(generics.RetrieveAPIView):
     permissions_classes = [permissions.IsAuthenticated]
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(VersionedCacheMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = [permissions.AllowAny]
-    filter_backends = [IngredientSearchFilter]
-    search_fields = ['^name']
+
+    def list(self, request, *args, **kwargs):
+        return self.versioned_response(self.list_from_index, request,
+                                       *args, **kwargs)
+
+    def list_from_index(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if not name:
+            # Полный список отдаётся потоком прямо из индекса: память на
+            # запрос ограничена размером куска, а таблица не читается.
+            return streaming_list_response(ingredient_index.all())
+        limit = request.query_params.get('limit')
+        limit = int(limit) if limit and limit.isdigit() else None
+        return Response(ingredient_index.search(name, limit))
@@ -0,0 +1,256 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import suppress
+from time import monotonic
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+logger = logging.getLogger('foodgram.metrics')
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+HISTOGRAMS = {
+    'http_request_duration_seconds': (
+        DURATION_BUCKETS, 'Время обработки запроса'),
+    'http_request_queries': (
+        QUERY_BUCKETS, 'Количество SQL-запросов на HTTP-запрос'),
+    'http_response_size_bytes': (SIZE_BUCKETS, 'Размер ответа'),
+}
+COUNTERS = {
+    'http_requests_total': 'Количество HTTP-запросов',
+    'cache_requests_total': 'Обращения к кэшам',
+    'cache_lookup_seconds_total': 'Суммарное время обращений к кэшам',
+}
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+FILE_PREFIX = 'metrics-'
+FILE_SUFFIX = '.json'
+
+
+def label_key(labels):
+    return json.dumps(sorted(labels.items()), ensure_ascii=False)
+
+
+class Registry:
+
+    def __init__(self, directory=None, flush_interval=1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._flush_lock = threading.Lock()
+        self.pid = os.getpid()
+        self.histograms = defaultdict(dict)
+        self.counters = defaultdict(dict)
+        self.flushed_at = monotonic()
+
+    def _check_fork(self):
+        if os.getpid() != self.pid:
+            self._reset()
+
+    def observe(self, name, value, **labels):
+        buckets = HISTOGRAMS[name][0]
+        key = label_key(labels)
+        with self._lock:
+            self._check_fork()
+            series = self.histograms[name].get(key)
+            if series is None:
+                series = self.histograms[name][key] = {
+                    'buckets': [0] * (len(buckets) + 1), 'sum': 0, 'count': 0}
+            series['buckets'][bisect_left(buckets, value)] += 1
+            series['sum'] += value
+            series['count'] += 1
+        self.maybe_flush()
+
+    def inc(self, name, value=1, **labels):
+        if not value:
+            return
+        key = label_key(labels)
+        with self._lock:
+            self._check_fork()
+            counters = self.counters[name]
+            counters[key] = counters.get(key, 0) + value
+        self.maybe_flush()
+
+    def snapshot(self):
+        with self._lock:
+            self._check_fork()
+            return json.loads(json.dumps({
+                'histograms': self.histograms, 'counters': self.counters}))
+
+    def maybe_flush(self):
+        if (self.directory is None
+                or monotonic() - self.flushed_at < self.flush_interval):
+            return
+        if not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            if monotonic() - self.flushed_at >= self.flush_interval:
+                self._write()
+        finally:
+            self._flush_lock.release()
+
+    def flush(self):
+        if self.directory is None:
+            return
+        with self._flush_lock:
+            self._write()
+
+    def _write(self):
+        self.flushed_at = monotonic()
+        path = os.path.join(self.directory,
+                            f'{FILE_PREFIX}{os.getpid()}{FILE_SUFFIX}')
+        temp_path = None
+        try:
+            data = json.dumps(self.snapshot(), ensure_ascii=False)
+            os.makedirs(self.directory, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                    'w', encoding='utf-8', dir=self.directory,
+                    prefix=f'.{FILE_PREFIX}', suffix='.tmp',
+                    delete=False) as file:
+                temp_path = file.name
+                file.write(data)
+            os.replace(temp_path, path)
+        except OSError:
+            logger.warning('Не удалось сохранить метрики в %s',
+                           self.directory, exc_info=True)
+            if temp_path is not None:
+                with suppress(OSError):
+                    os.remove(temp_path)
+
+    def collect(self):
+        if self.directory is None:
+            return self.snapshot()
+        self.flush()
+        total = {'histograms': {}, 'counters': {}}
+        try:
+            names = sorted(os.listdir(self.directory))
+        except OSError:
+            return self.snapshot()
+        for name in names:
+            pid = worker_pid(name)
+            if pid is None:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if not process_alive(pid):
+                    os.remove(path)
+                    continue
+                with open(path, encoding='utf-8') as file:
+                    merge(total, json.load(file))
+            except (OSError, ValueError):
+                continue
+        return total
+
+
+def worker_pid(name):
+    if not (name.startswith(FILE_PREFIX) and name.endswith(FILE_SUFFIX)):
+        return None
+    pid = name[len(FILE_PREFIX):-len(FILE_SUFFIX)]
+    return int(pid) if pid.isdigit() else None
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def merge(total, data):
+    for name, series in data['histograms'].items():
+        merged = total['histograms'].setdefault(name, {})
+        for key, values in series.items():
+            if key not in merged:
+                merged[key] = values
+                continue
+            target = merged[key]
+            target['buckets'] = [
+                a + b for a, b in zip(target['buckets'], values['buckets'])]
+            target['sum'] += values['sum']
+            target['count'] += values['count']
+    for name, series in data['counters'].items():
+        merged = total['counters'].setdefault(name, {})
+        for key, value in series.items():
+            merged[key] = merged.get(key, 0) + value
+
+
+def counter_totals(data, name, label, **labels):
+    totals = defaultdict(int)
+    for key, value in data['counters'].get(name, {}).items():
+        series = dict(json.loads(key))
+        if labels.items() <= series.items():
+            totals[series.get(label)] += value
+    return dict(totals)
+
+
+def format_labels(key, **extra):
+    labels = [*json.loads(key), *extra.items()]
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        f'{name}="{escape_label(value)}"' for name, value in labels) + '}'
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace(
+        '"', '\\"').replace('\n', '\\n')
+
+
+def render(data):
+    lines = []
+    for name, (buckets, description) in HISTOGRAMS.items():
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} histogram']
+        for key, series in sorted(data['histograms'].get(name, {}).items()):
+            cumulative = 0
+            for bound, count in zip((*buckets, '+Inf'), series['buckets']):
+                cumulative += count
+                lines.append(f'{name}_bucket{format_labels(key, le=bound)} '
+                             f'{cumulative}')
+            lines.append(f'{name}_sum{format_labels(key)} {series["sum"]}')
+            lines.append(
+                f'{name}_count{format_labels(key)} {series["count"]}')
+    for name, description in COUNTERS.items():
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} counter']
+        for key, value in sorted(data['counters'].get(name, {}).items()):
+            lines.append(f'{name}{format_labels(key)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def quantile(buckets, counts, q):
+    total = sum(counts)
+    if not total:
+        return None
+    rank = q * total
+    cumulative = 0
+    lower = 0
+    for bound, count in zip((*buckets, float('inf')), counts):
+        if count and cumulative + count >= rank:
+            if bound == float('inf'):
+                return lower
+            return lower + (bound - lower) * (rank - cumulative) / count
+        cumulative += count
+        lower = bound
+    return lower
+
+
+registry = Registry(settings.METRICS_DIR, settings.METRICS_FLUSH_INTERVAL)
+
+
+def metrics_view(request):
+    allowed = settings.METRICS_ALLOWED_IPS
+    if allowed and request.META.get('REMOTE_ADDR') not in allowed:
+        raise Http404
+    return HttpResponse(render(registry.collect()), content_type=CONTENT_TYPE)
@@ -0,0 +1,220 @@
+import json
+import logging
+import random
+import re
+import sys
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework.serializers import BaseSerializer
+
+from .metrics import registry
+
+logger = logging.getLogger('foodgram.queries')
+
+IN_LIST = re.compile(r'\((?:%s, )+%s\)')
+SHAPE_LOG_LENGTH = 300
+
+current_inspection = ContextVar('current_inspection', default=None)
+
+
+def serializer_field(frame):
+    while frame is not None:
+        if frame.f_code.co_name == 'to_representation':
+            owner = frame.f_locals.get('self')
+            field = frame.f_locals.get('field')
+            if isinstance(owner, BaseSerializer) and field is not None:
+                return f'{type(owner).__name__}.{field.field_name}'
+        frame = frame.f_back
+    return None
+
+
+@contextmanager
+def wrap_queries(wrapper):
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(wrapper))
+        yield
+
+
+def is_streamed(response):
+    return (response.streaming
+            and getattr(response, 'file_to_stream', None) is None)
+
+
+def stream_with(response, wrapper, finish):
+    # Тело потокового ответа читается уже после выхода из middleware,
+    # поэтому запросы к БД при генерации каждого куска считаем отдельно.
+    content = response.streaming_content
+
+    def stream():
+        size = 0
+        try:
+            while True:
+                with wrapper():
+                    chunk = next(content, None)
+                if chunk is None:
+                    return
+                size += len(chunk)
+                yield chunk
+        finally:
+            finish(size)
+
+    response.streaming_content = stream()
+
+
+@contextmanager
+def timer(name):
+    inspection = current_inspection.get()
+    if inspection is None:
+        yield
+        return
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        inspection.timings[name] += perf_counter() - start
+
+
+class Inspection:
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.queries = 0
+        self.db_time = 0.0
+        self.shapes = Counter()
+        self.suspects = {}
+        self.timings = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += perf_counter() - start
+            self.queries += 1
+            shape = IN_LIST.sub('(...)', sql) if '%s, %s' in sql else sql
+            self.shapes[shape] += 1
+            if self.shapes[shape] == self.threshold:
+                self.suspects[shape] = serializer_field(sys._getframe(1))
+
+    def n_plus_one(self):
+        return [
+            {'sql': shape[:SHAPE_LOG_LENGTH], 'count': self.shapes[shape],
+             'field': field}
+            for shape, field in self.suspects.items()
+        ]
+
+    def server_timing(self, total):
+        metrics = [f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} '
+                   f'queries"']
+        metrics += [f'{name};dur={duration * 1000:.1f}'
+                    for name, duration in self.timings.items()]
+        metrics.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(metrics)
+
+
+@contextmanager
+def inspecting(inspection):
+    token = current_inspection.set(inspection)
+    try:
+        with wrap_queries(inspection):
+            yield
+    finally:
+        current_inspection.reset(token)
+
+
+class QueryInspectionMiddleware:
+
+    def __init__(self, get_response):
+        if not settings.QUERY_INSPECTION_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = settings.QUERY_INSPECTION_SAMPLE_RATE
+        self.threshold = settings.QUERY_INSPECTION_N_PLUS_ONE_THRESHOLD
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+        inspection = Inspection(self.threshold)
+        start = perf_counter()
+        with inspecting(inspection):
+            response = self.get_response(request)
+        response['Server-Timing'] = inspection.server_timing(
+            perf_counter() - start)
+        if is_streamed(response):
+            stream_with(response, lambda: inspecting(inspection),
+                        lambda size: self.log(request, response, inspection,
+                                              perf_counter() - start))
+        else:
+            self.log(request, response, inspection, perf_counter() - start)
+        return response
+
+    def log(self, request, response, inspection, total):
+        match = request.resolver_match
+        n_plus_one = inspection.n_plus_one()
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'route': match.view_name if match else None,
+            'status': response.status_code,
+            'queries': inspection.queries,
+            'db_ms': round(inspection.db_time * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+            **{f'{name}_ms': round(duration * 1000, 2)
+               for name, duration in inspection.timings.items()},
+            'n_plus_one': n_plus_one,
+        }
+        logger.log(logging.WARNING if n_plus_one else logging.INFO,
+                   json.dumps(record, ensure_ascii=False))
+
+
+class QueryCounter:
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        start = perf_counter()
+        with wrap_queries(counter):
+            response = self.get_response(request)
+        if is_streamed(response):
+            stream_with(response, lambda: wrap_queries(counter),
+                        lambda size: self.observe(request, response, counter,
+                                                  start, size))
+        elif response.streaming:
+            self.observe(request, response, counter, start)
+        else:
+            self.observe(request, response, counter, start,
+                         len(response.content))
+        return response
+
+    def observe(self, request, response, counter, start, size=None):
+        duration = perf_counter() - start
+        match = request.resolver_match
+        route = match.view_name if match else 'unmatched'
+        registry.observe('http_request_duration_seconds', duration,
+                         route=route, method=request.method)
+        registry.observe('http_request_queries', counter.count, route=route)
+        if size is not None:
+            registry.observe('http_response_size_bytes', size, route=route)
+        registry.inc('http_requests_total', route=route,
+                     method=request.method, status=response.status_code)
@@ -34,6 +34,8 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = 'users.User'
 
 MIDDLEWARE = [
+    'foodgram.middleware.MetricsMiddleware',
+    'foodgram.middleware.QueryInspectionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -84,6 +86,16 @@ else:
     }
 
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
+    }
+}
+
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -132,8 +144,67 @@ DJOSER = {
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ],
 }
 
+API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', default=100))
+STREAMING_CHUNK_SIZE = int(os.getenv('STREAMING_CHUNK_SIZE', default=500))
+
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', default=10000))
+AUTH_TOKEN_CACHE_TTL = int(os.getenv('AUTH_TOKEN_CACHE_TTL', default=60))
+AUTH_TOKEN_SHARED_CACHE = os.getenv('AUTH_TOKEN_SHARED_CACHE', default=None)
+# Без общего кэша отзыв токена сбрасывает только кэш процесса, который
+# обработал изменение: остальные воркеры принимают токен ещё до
+# AUTH_TOKEN_LOCAL_TTL секунд.
+AUTH_TOKEN_LOCAL_TTL = int(os.getenv('AUTH_TOKEN_LOCAL_TTL', default=5))
+
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', default=10000))
+FEED_FANOUT_BATCH_SIZE = int(os.getenv('FEED_FANOUT_BATCH_SIZE',
+                                       default=1000))
+FEED_BACKFILL_SIZE = int(os.getenv('FEED_BACKFILL_SIZE', default=50))
+
+QUERY_INSPECTION_ENABLED = int(os.getenv('QUERY_INSPECTION_ENABLED',
+                                         default=0))
+QUERY_INSPECTION_SAMPLE_RATE = float(os.getenv(
+    'QUERY_INSPECTION_SAMPLE_RATE', default=0.1))
+QUERY_INSPECTION_N_PLUS_ONE_THRESHOLD = int(os.getenv(
+    'QUERY_INSPECTION_N_PLUS_ONE_THRESHOLD', default=10))
+
+METRICS_ENABLED = int(os.getenv('METRICS_ENABLED', default=1))
+METRICS_DIR = os.getenv('METRICS_DIR', default=None)
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL',
+                                         default=1.0))
+METRICS_ALLOWED_IPS = [
+    ip.strip() for ip in os.getenv(
+        'METRICS_ALLOWED_IPS', default='127.0.0.1').split(',') if ip.strip()
+]
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'foodgram.queries': {
+            'handlers': ['console'],
+            'level': os.getenv('QUERY_INSPECTION_LOG_LEVEL', default='INFO'),
+            'propagate': False,
+        },
+    },
+}
+
 VALIDATOR_MESSAGE = 'Введите число начиная от 1'
+
+BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', default=2))
+
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
@@ -0,0 +1,454 @@
+import argparse
+import asyncio
+import base64
+import json
+import math
+import random
+import ssl
+import struct
+import sys
+import time
+import zlib
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from urllib.parse import quote, urlsplit
+
+PERCENTILES = (50, 90, 95, 99)
+FOLLOW_NEXT_PAGE = 0.5
+DEFAULT_WEIGHTS = {
+    'browse': 50,
+    'autocomplete': 20,
+    'toggle': 15,
+    'shopping_list': 10,
+    'create': 5,
+}
+
+
+scenario_errors = ContextVar('scenario_errors', default=None)
+
+
+class HTTPError(Exception):
+    pass
+
+
+class Connection:
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.closed = False
+
+    async def request(self, host, method, path, headers, body):
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {host}',
+                 f'Content-Length: {len(body)}', 'Connection: keep-alive']
+        lines += [f'{name}: {value}' for name, value in headers.items()]
+        self.writer.write(
+            ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await self.writer.drain()
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise HTTPError('Соединение закрыто сервером')
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+        if response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            content = await self.read_chunked()
+        elif 'content-length' in response_headers:
+            content = await self.reader.readexactly(
+                int(response_headers['content-length']))
+        else:
+            content = await self.reader.read()
+            self.closed = True
+        if (response_headers.get('connection', '').lower() == 'close'
+                or status_line.startswith(b'HTTP/1.0')):
+            self.closed = True
+        return status, response_headers, content
+
+    async def read_chunked(self):
+        chunks = []
+        while True:
+            size = int((await self.reader.readline()).split(b';')[0], 16)
+            if not size:
+                while (await self.reader.readline()) not in (b'\r\n', b''):
+                    pass
+                return b''.join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readexactly(2)
+
+    def close(self):
+        self.closed = True
+        self.writer.close()
+
+
+class Client:
+
+    def __init__(self, url, connections, timeout):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.host_header = parts.netloc
+        self.prefix = parts.path.rstrip('/')
+        self.ssl = ssl.create_default_context() if (
+            parts.scheme == 'https') else None
+        self.timeout = timeout
+        self.slots = asyncio.Semaphore(connections)
+        self.idle = []
+
+    async def acquire(self):
+        while self.idle:
+            connection = self.idle.pop()
+            if not connection.closed:
+                return connection
+        reader, writer = await asyncio.open_connection(
+            self.host, self.port, ssl=self.ssl)
+        return Connection(reader, writer)
+
+    def release(self, connection):
+        if connection.closed:
+            connection.writer.close()
+        else:
+            self.idle.append(connection)
+
+    async def request(self, method, path, token=None, data=None):
+        headers = {'Accept': '*/*'}
+        body = b''
+        if data is not None:
+            body = json.dumps(data).encode()
+            headers['Content-Type'] = 'application/json'
+        if token is not None:
+            headers['Authorization'] = f'Token {token}'
+        async with self.slots:
+            connection = await self.acquire()
+            try:
+                response = await asyncio.wait_for(connection.request(
+                    self.host_header, method, self.prefix + path, headers,
+                    body), self.timeout)
+            except BaseException:
+                connection.close()
+                raise
+            self.release(connection)
+        return response
+
+    def close(self):
+        for connection in self.idle:
+            connection.close()
+        self.idle = []
+
+
+class Stats:
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.errors = Counter()
+        self.scenarios = defaultdict(list)
+        self.scenario_errors = Counter()
+        self.dropped = 0
+
+    def record(self, name, latency, status):
+        self.latencies[name].append(latency)
+        self.statuses[name][status] += 1
+
+    def summary(self, elapsed):
+        requests = sum(len(values) for values in self.latencies.values())
+        return {
+            'elapsed_seconds': round(elapsed, 3),
+            'requests': requests,
+            'throughput_rps': round(requests / elapsed, 2) if elapsed else 0,
+            'dropped_scenarios': self.dropped,
+            'endpoints': {
+                name: self.describe(values, self.statuses[name],
+                                    self.errors[name])
+                for name, values in sorted(self.latencies.items())
+            },
+            'scenarios': {
+                name: self.describe(values, None, self.scenario_errors[name])
+                for name, values in sorted(self.scenarios.items())
+            },
+        }
+
+    @staticmethod
+    def describe(values, statuses, errors):
+        values = sorted(values)
+        result = {
+            'count': len(values),
+            'error_rate': round(errors / len(values), 4) if values else 0,
+            **{f'p{p}_ms': round(percentile(values, p) * 1000, 2)
+               for p in PERCENTILES},
+            'max_ms': round(values[-1] * 1000, 2) if values else 0,
+        }
+        if statuses is not None:
+            result['statuses'] = {str(status): count
+                                  for status, count in statuses.items()}
+        return result
+
+
+def percentile(values, p):
+    if not values:
+        return 0
+    return values[max(math.ceil(p / 100 * len(values)) - 1, 0)]
+
+
+def png_data_uri(rng, size):
+    row = size * 3
+    raw = b''.join(b'\x00' + bytes(rng.getrandbits(8) for _ in range(row))
+                   for _ in range(size))
+
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data
+                + struct.pack('>I', zlib.crc32(kind + data)))
+
+    png = (b'\x89PNG\r\n\x1a\n'
+           + chunk(b'IHDR', struct.pack('>IIBBBBB', size, size, 8, 2, 0, 0, 0))
+           + chunk(b'IDAT', zlib.compress(raw))
+           + chunk(b'IEND', b''))
+    return 'data:image/png;base64,' + base64.b64encode(png).decode()
+
+
+def parse_stages(value):
+    stages = []
+    for stage in value.split(','):
+        rate, _, duration = stage.partition('@')
+        stages.append((float(rate), float(duration)))
+    return stages
+
+
+def parse_weights(value):
+    weights = dict(DEFAULT_WEIGHTS)
+    for item in filter(None, value.split(',')):
+        name, _, weight = item.partition('=')
+        if name not in DEFAULT_WEIGHTS:
+            raise argparse.ArgumentTypeError(f'Неизвестный сценарий {name}')
+        weights[name] = float(weight)
+    return weights
+
+
+def arrival_rate(stages, elapsed):
+    previous = 0.0
+    for rate, duration in stages:
+        if elapsed < duration:
+            return previous + (rate - previous) * elapsed / duration
+        elapsed -= duration
+        previous = rate
+    return None
+
+
+class LoadTest:
+
+    def __init__(self, options):
+        self.options = options
+        self.rng = random.Random(options.seed)
+        self.client = Client(options.url, options.connections,
+                             options.timeout)
+        self.stats = Stats()
+        self.tokens = []
+        self.tags = []
+        self.ingredients = []
+        self.recipes = []
+        self.images = []
+
+    async def call(self, name, method, path, token=None, data=None,
+                   expected=(200,)):
+        start = time.perf_counter()
+        try:
+            status, _, content = await self.client.request(
+                method, path, token, data)
+        except (OSError, HTTPError, asyncio.TimeoutError,
+                asyncio.IncompleteReadError, ValueError, IndexError):
+            status, content = 'error', None
+        self.stats.record(name, time.perf_counter() - start, status)
+        if status not in expected:
+            self.stats.errors[name] += 1
+            errors = scenario_errors.get()
+            if errors is not None:
+                errors.append(name)
+            return None
+        if not content:
+            return {}
+        try:
+            return json.loads(content)
+        except ValueError:
+            return content
+
+    async def setup(self):
+        options = self.options
+        logins = await asyncio.gather(*(
+            self.call('login', 'POST', '/api/auth/token/login/', data={
+                'email': f'{options.prefix}{i}@example.com',
+                'password': options.password,
+            }) for i in range(options.users)))
+        self.tokens = [login['auth_token'] for login in logins if login]
+        if not self.tokens:
+            raise SystemExit('Не удалось войти ни одним пользователем, '
+                             'сгенерируйте данные командой generate_dataset')
+        self.tags = await self.call('setup', 'GET', '/api/tags/') or []
+        self.ingredients = await self.call(
+            'setup', 'GET', '/api/ingredients/') or []
+        recipes = await self.call(
+            'setup', 'GET', '/api/recipes/?limit=100', self.tokens[0])
+        self.recipes = [recipe['id'] for recipe in
+                        (recipes or {}).get('results', [])]
+        if not (self.tags and self.ingredients and self.recipes):
+            raise SystemExit('На сервере нет тегов, ингредиентов или '
+                             'рецептов')
+        self.images = [png_data_uri(self.rng, options.image_size)
+                       for _ in range(4)]
+        self.stats = Stats()
+
+    async def browse(self, rng, token):
+        tags = rng.sample(self.tags, min(rng.randint(0, 2), len(self.tags)))
+        query = ''.join(f'&tags={tag["slug"]}' for tag in tags)
+        page = await self.call('recipe_list', 'GET',
+                               f'/api/recipes/?limit=6{query}', token)
+        if page and page['next'] and rng.random() < FOLLOW_NEXT_PAGE:
+            parts = urlsplit(page['next'])
+            page = await self.call('recipe_list', 'GET',
+                                   f'{parts.path}?{parts.query}', token)
+        results = (page or {}).get('results')
+        if results:
+            recipe = rng.choice(results)
+            await self.call('recipe_detail', 'GET',
+                            f'/api/recipes/{recipe["id"]}/', token)
+        await self.call('recipe_feed', 'GET', '/api/recipes/feed/?limit=6',
+                        token)
+
+    async def autocomplete(self, rng, token):
+        name = rng.choice(self.ingredients)['name']
+        for length in range(1, min(len(name), rng.randint(2, 6)) + 1):
+            await self.call(
+                'ingredient_search', 'GET',
+                f'/api/ingredients/?name={quote(name[:length])}', token)
+            await asyncio.sleep(rng.uniform(0.05, 0.2))
+
+    async def toggle(self, rng, token):
+        kind = rng.choice(('favorite', 'shopping_cart'))
+        path = f'/api/recipes/{rng.choice(self.recipes)}/{kind}/'
+        await self.call(f'{kind}_add', 'POST', path, token,
+                        expected=(201, 400))
+        await self.call(f'{kind}_remove', 'DELETE', path, token,
+                        expected=(204, 400))
+
+    async def shopping_list(self, rng, token):
+        await self.call('shopping_cart_download', 'GET',
+                        '/api/recipes/download_shopping_cart/', token)
+
+    async def create(self, rng, token):
+        ingredients = rng.sample(self.ingredients,
+                                 min(rng.randint(3, 10),
+                                     len(self.ingredients)))
+        data = {
+            'name': f'Нагрузочный тест {rng.getrandbits(32):08x}',
+            'text': 'Рецепт создан нагрузочным тестом.',
+            'cooking_time': rng.randint(5, 120),
+            'image': rng.choice(self.images),
+            'tags': [tag['id'] for tag in rng.sample(
+                self.tags, min(2, len(self.tags)))],
+            'ingredients': [{'id': item['id'],
+                             'amount': rng.randint(1, 500)}
+                            for item in ingredients],
+        }
+        recipe = await self.call('recipe_create', 'POST', '/api/recipes/',
+                                 token, data, expected=(201,))
+        if recipe and not self.options.keep_recipes:
+            await self.call('recipe_delete', 'DELETE',
+                            f'/api/recipes/{recipe["id"]}/', token,
+                            expected=(204,))
+
+    async def run_scenario(self, name, scheduled):
+        rng = random.Random(self.rng.getrandbits(64))
+        errors = []
+        scenario_errors.set(errors)
+        try:
+            await getattr(self, name)(rng, rng.choice(self.tokens))
+        finally:
+            self.stats.scenarios[name].append(
+                time.perf_counter() - scheduled)
+            if errors:
+                self.stats.scenario_errors[name] += 1
+
+    async def run(self):
+        options = self.options
+        await self.setup()
+        names = list(options.weights)
+        weights = [options.weights[name] for name in names]
+        tasks = set()
+        start = time.perf_counter()
+        scheduled = start
+        while True:
+            rate = arrival_rate(options.stages, scheduled - start)
+            if rate is None:
+                break
+            if rate <= 0:
+                scheduled += 0.1
+                continue
+            scheduled += self.rng.expovariate(rate)
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if len(tasks) >= options.max_in_flight:
+                self.stats.dropped += 1
+                continue
+            name = self.rng.choices(names, weights)[0]
+            task = asyncio.ensure_future(self.run_scenario(name, scheduled))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.wait(tasks)
+        elapsed = time.perf_counter() - start
+        self.client.close()
+        return self.stats.summary(elapsed)
+
+
+def print_summary(summary):
+    print(f'{summary["requests"]} requests in '
+          f'{summary["elapsed_seconds"]}s, '
+          f'{summary["throughput_rps"]} req/s, '
+          f'{summary["dropped_scenarios"]} scenarios dropped')
+    for title in ('endpoints', 'scenarios'):
+        print(f'\n{title}:')
+        for name, row in summary[title].items():
+            print(f'  {name:24} n={row["count"]:<6} '
+                  f'err={row["error_rate"]:<7.2%} '
+                  + ' '.join(f'p{p}={row[f"p{p}_ms"]:.1f}ms'
+                             for p in PERCENTILES))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Нагрузочный тест API Foodgram с открытой моделью '
+                    'поступления запросов.')
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--stages', type=parse_stages,
+                        default=parse_stages('5@10,20@30,20@30'),
+                        help='Ступени нагрузки rate@seconds через запятую; '
+                             'частота меняется линейно от предыдущей')
+    parser.add_argument('--weights', type=parse_weights,
+                        default=dict(DEFAULT_WEIGHTS),
+                        help='Веса сценариев, например browse=5,create=0')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--prefix', default='bench')
+    parser.add_argument('--password', default='bench-password')
+    parser.add_argument('--connections', type=int, default=50)
+    parser.add_argument('--max-in-flight', type=int, default=1000)
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--image-size', type=int, default=64)
+    parser.add_argument('--keep-recipes', action='store_true')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', dest='json_path',
+                        help='Сохранить итоги в JSON-файл')
+    options = parser.parse_args(argv)
+    summary = asyncio.run(LoadTest(options).run())
+    print_summary(summary)
+    if options.json_path:
+        with open(options.json_path, 'w', encoding='utf-8') as file:
+            json.dump(summary, file, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,7 +1,9 @@
 from django.contrib import admin
 
+from .deletion import delete_recipes
+from .images import schedule_variants
 from .models import (Favorites, Follow, Ingredient, Recipe, RecipeIngredient,
-                     RecipeTag, ShoppingCart, Tag)
+                     RecipeTag, ShoppingCart, ShoppingListItem, Tag)
 
 admin.site.empty_value_display = '--Пусто--'
 
@@ -29,8 +31,22 @@ class RecipeAdmin(admin.ModelAdmin):
     readonly_fields = ('add_to_favorites',)
     inlines = (RecipeIngredientInline, RecipeTagInline,)
 
+    def save_model(self, request, obj, form, change):
+        image_changed = 'image' in form.changed_data
+        if image_changed:
+            obj.image_variants_ready = False
+        super().save_model(request, obj, form, change)
+        if image_changed:
+            schedule_variants(obj)
+
+    def delete_model(self, request, obj):
+        delete_recipes([obj])
+
+    def delete_queryset(self, request, queryset):
+        delete_recipes(list(queryset))
+
     def add_to_favorites(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
 
     add_to_favorites.short_description = "В избранном, раз"
 
@@ -80,3 +96,10 @@ class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ('pk', 'user', 'recipe')
     search_fields = ('user',)
     list_filter = ('user',)
+
+
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'user', 'ingredient', 'amount', 'updated')
+    search_fields = ('user__username', 'ingredient__name')
+    list_filter = ('user',)
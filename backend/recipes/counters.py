@@ -0,0 +1,42 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Favorites, Follow, Recipe, ShoppingCart
+
+User = get_user_model()
+
+RECIPE_COUNTERS = {
+    Favorites: 'favorites_count',
+    ShoppingCart: 'in_carts_count',
+}
+
+
+def change_counter(model, pk, field, delta):
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0)})
+
+
+def change_counters(model, pks, field, delta):
+    if pks:
+        model.objects.filter(pk__in=pks).update(
+            **{field: Greatest(F(field) + delta, 0)})
+
+
+def count_related(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def reconcile_counters():
+    recipes = Recipe.objects.update(
+        favorites_count=count_related(Favorites, 'recipe'),
+        in_carts_count=count_related(ShoppingCart, 'recipe'),
+    )
+    users = User.objects.update(
+        recipes_count=count_related(Recipe, 'author'),
+        followers_count=count_related(Follow, 'author'),
+    )
+    return recipes, users
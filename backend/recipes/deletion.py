@@ -0,0 +1,36 @@
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from .counters import change_counter
+from .models import Recipe, ShoppingListItem, recipe_amounts
+
+User = get_user_model()
+
+writes_handled = ContextVar('writes_handled', default=False)
+deleting = ContextVar('deleting', default=frozenset())
+
+
+@contextmanager
+def handled_writes():
+    token = writes_handled.set(True)
+    try:
+        yield
+    finally:
+        writes_handled.reset(token)
+
+
+@transaction.atomic
+def delete_recipes(recipes):
+    with handled_writes():
+        for recipe in recipes:
+            ShoppingListItem.objects.update_recipe(
+                recipe, recipe_amounts(recipe), {})
+        authors = Counter(recipe.author_id for recipe in recipes)
+        for author_id, count in authors.items():
+            change_counter(User, author_id, 'recipes_count', -count)
+        Recipe.objects.filter(
+            pk__in=[recipe.pk for recipe in recipes]).delete()
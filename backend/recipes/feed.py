@@ -0,0 +1,62 @@
+from django.conf import settings
+
+from .background import run_on_commit
+from .models import FeedEntry, Follow, Recipe
+
+
+def make_entries(user_ids, recipes):
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, recipe_id=recipe_id, author_id=author_id,
+                   pub_date=pub_date)
+         for user_id in user_ids
+         for recipe_id, author_id, pub_date in recipes),
+        ignore_conflicts=True,
+    )
+
+
+def fan_out_recipe(recipe_id):
+    recipe = Recipe.objects.filter(
+        pk=recipe_id,
+        author__followers_count__lte=settings.FEED_FANOUT_LIMIT,
+    ).values_list('id', 'author_id', 'pub_date').first()
+    if recipe is None:
+        return
+    followers = Follow.objects.filter(author_id=recipe[1]).order_by('pk')
+    last_id = 0
+    while True:
+        batch = list(followers.filter(pk__gt=last_id).values_list(
+            'pk', 'user_id')[:settings.FEED_FANOUT_BATCH_SIZE])
+        if not batch:
+            return
+        make_entries([user_id for _, user_id in batch], [recipe])
+        last_id = batch[-1][0]
+
+
+def schedule_fan_out(recipe):
+    run_on_commit(fan_out_recipe, recipe.pk)
+
+
+def latest_recipes(author_ids):
+    recipes = Recipe.objects.filter(author_id__in=author_ids)
+    return list(recipes.order_by('-pub_date', '-id').values_list(
+        'id', 'author_id', 'pub_date')[:settings.FEED_BACKFILL_SIZE])
+
+
+def backfill_feed(user, author):
+    make_entries([user.pk], latest_recipes([author.pk]))
+
+
+def prune_feed(user, author):
+    FeedEntry.objects.filter(user=user, author=author).delete()
+
+
+def feed_sources(user):
+    # Рецепты авторов без рассылки читаются при запросе и сливаются
+    # с записями ленты по (pub_date, id).
+    unfanned = Follow.objects.filter(
+        user=user, author__followers_count__gt=settings.FEED_FANOUT_LIMIT
+    ).values('author_id')
+    return (
+        (FeedEntry.objects.filter(user=user), 'recipe_id'),
+        (Recipe.objects.filter(author_id__in=unfanned), 'id'),
+    )
@@ -0,0 +1,90 @@
+import posixpath
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import F
+from PIL import Image, ImageOps, features
+
+from .background import run_on_commit
+from .models import Recipe
+from .storage import file_digest, name_digest, recipe_image_storage
+
+IMAGES_DIR = 'recipes/images'
+VARIANTS_DIR = 'recipes/variants'
+VARIANTS = {
+    'thumb': (160, 160),
+    'card': (480, 480),
+    'full': (1280, 1280),
+}
+if features.check('webp'):
+    VARIANT_FORMAT, VARIANT_EXTENSION = 'WEBP', 'webp'
+else:
+    VARIANT_FORMAT, VARIANT_EXTENSION = 'JPEG', 'jpg'
+
+
+def same_content(stored, upload):
+    if not stored or upload is None:
+        return not stored and upload is None
+    if name_digest(stored.name) == file_digest(upload):
+        return True
+    try:
+        if stored.size != upload.size:
+            return False
+        with stored.open('rb'):
+            return file_digest(stored) == file_digest(upload)
+    except OSError:
+        return False
+
+
+def variant_name(name, variant):
+    relative = posixpath.relpath(name, IMAGES_DIR)
+    return f'{VARIANTS_DIR}/{relative}.{variant}.{VARIANT_EXTENSION}'
+
+
+def variant_source(name):
+    relative = posixpath.relpath(name, VARIANTS_DIR)
+    return posixpath.join(IMAGES_DIR, relative.rsplit('.', 2)[0])
+
+
+def variant_names(name):
+    return {variant: variant_name(name, variant) for variant in VARIANTS}
+
+
+def render_variant(image, size):
+    variant = image.copy()
+    variant.thumbnail(size, Image.LANCZOS)
+    buffer = BytesIO()
+    variant.save(buffer, VARIANT_FORMAT, quality=80, method=4)
+    return buffer.getvalue()
+
+
+def build_variants(name, force=False):
+    targets = {variant: variant_name(name, variant) for variant in VARIANTS
+               if force or not default_storage.exists(
+                   variant_name(name, variant))}
+    if not targets:
+        return
+    with recipe_image_storage.open(name, 'rb') as file:
+        image = ImageOps.exif_transpose(Image.open(file))
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    if VARIANT_FORMAT == 'JPEG' and image.mode == 'RGBA':
+        image = image.convert('RGB')
+    for variant, target in targets.items():
+        if default_storage.exists(target):
+            default_storage.delete(target)
+        default_storage.save(
+            target, ContentFile(render_variant(image, VARIANTS[variant])))
+
+
+def process_recipe_image(recipe_id, name, force=False):
+    build_variants(name, force)
+    Recipe.objects.filter(pk=recipe_id, image=name).update(
+        image_variants_ready=True, version=F('version') + 1)
+
+
+def schedule_variants(recipe):
+    if recipe.image:
+        run_on_commit(process_recipe_image, recipe.pk, recipe.image.name)
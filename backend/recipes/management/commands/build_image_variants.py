@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from recipes.images import process_recipe_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Создаёт превью изображений рецептов, для которых их ещё нет.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='пересоздать превью для всех рецептов')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').exclude(image=None)
+        if not options['all']:
+            recipes = recipes.filter(image_variants_ready=False)
+        processed = failed = 0
+        for recipe_id, name in list(recipes.values_list('id', 'image')):
+            try:
+                process_recipe_image(recipe_id, name, options['all'])
+            except (OSError, SyntaxError, ValueError) as error:
+                failed += 1
+                self.stderr.write(f'{name}: {error}')
+            else:
+                processed += 1
+        print(f'Processed images: {processed}, failed: {failed}.')
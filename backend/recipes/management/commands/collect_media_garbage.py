@@ -0,0 +1,83 @@
+import posixpath
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from recipes.images import IMAGES_DIR, VARIANTS_DIR, variant_source
+from recipes.models import Recipe
+
+
+def iter_files(storage, path):
+    if not storage.exists(path):
+        return
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield posixpath.join(path, name)
+    for directory in directories:
+        yield from iter_files(storage, posixpath.join(path, directory))
+
+
+def iter_batches(names, size):
+    batch = []
+    for name in names:
+        batch.append(name)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Command(BaseCommand):
+    help = ('Удаляет из медиа-хранилища изображения рецептов и превью, '
+            'на которые не ссылается ни один рецепт.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='сколько файлов проверять одним запросом')
+        parser.add_argument('--min-age', type=int, default=24,
+                            help='не трогать файлы моложе N часов')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='только показать, что будет удалено')
+
+    def handle(self, *args, **options):
+        storage = Recipe._meta.get_field('image').storage
+        self.dry_run = options['dry_run']
+        self.deadline = timezone.now() - timedelta(hours=options['min_age'])
+        self.checked = self.deleted = self.freed = 0
+        for batch in iter_batches(self.iter_old(storage, IMAGES_DIR),
+                                  options['batch_size']):
+            referenced = self.referenced(batch)
+            self.delete(storage, (name for name in batch
+                                  if name not in referenced))
+        for batch in iter_batches(
+                self.iter_old(default_storage, VARIANTS_DIR),
+                options['batch_size']):
+            referenced = self.referenced(
+                {variant_source(name) for name in batch})
+            self.delete(default_storage, (
+                name for name in batch
+                if variant_source(name) not in referenced))
+        action = 'Would delete' if self.dry_run else 'Deleted'
+        print(f'Checked files: {self.checked}. {action} {self.deleted} '
+              f'files, {self.freed / 1024 / 1024:.1f} MB.')
+
+    def iter_old(self, storage, path):
+        for name in iter_files(storage, path):
+            self.checked += 1
+            if storage.get_modified_time(name) < self.deadline:
+                yield name
+
+    def referenced(self, names):
+        return set(Recipe.objects.filter(image__in=names).values_list(
+            'image', flat=True))
+
+    def delete(self, storage, names):
+        for name in names:
+            self.freed += storage.size(name)
+            self.deleted += 1
+            if self.dry_run:
+                self.stdout.write(name)
+            else:
+                storage.delete(name)
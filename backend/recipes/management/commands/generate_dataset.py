@@ -0,0 +1,231 @@
+import hashlib
+import random
+import time
+from collections import Counter, defaultdict
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from recipes.counters import reconcile_counters
+from recipes.models import (Favorites, FeedEntry, Follow, Ingredient, Recipe,
+                            RecipeIngredient, RecipeTag, ShoppingCart,
+                            ShoppingListItem, Tag, tags_mask)
+from users.models import User
+
+from .loader import batches
+
+TAG_NAMES = ('Завтрак', 'Обед', 'Ужин', 'Перекус', 'Десерт', 'Выпечка',
+             'Суп', 'Салат', 'Гарнир', 'Напиток', 'Постное', 'Детское')
+FIRST_NAMES = ('Анна', 'Иван', 'Мария', 'Пётр', 'Ольга', 'Сергей', 'Елена',
+               'Дмитрий', 'Наталья', 'Алексей')
+LAST_NAMES = ('Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев',
+              'Петров', 'Соколов', 'Михайлов', 'Новиков', 'Фёдоров')
+DISHES = ('Суп', 'Салат', 'Рагу', 'Запеканка', 'Пирог', 'Омлет', 'Паста',
+          'Каша', 'Котлеты', 'Блины')
+WORDS = ('нарежьте', 'добавьте', 'смешайте', 'обжарьте', 'варите',
+         'посолите', 'перемешайте', 'подавайте', 'минут', 'до', 'готовности',
+         'на', 'среднем', 'огне', 'в', 'кастрюле', 'сковороде', 'духовке',
+         'и', 'с')
+TAGS_PER_RECIPE = (1, 3)
+INGREDIENTS_PER_RECIPE = (3, 12)
+AMOUNT = (1, 500)
+COOKING_TIME = (5, 180)
+TEXT_WORDS = (30, 250)
+PARETO_ALPHA = 1.2
+
+
+def cumulative_weights(rng, size):
+    return list(accumulate(rng.paretovariate(PARETO_ALPHA)
+                           for _ in range(size)))
+
+
+def weighted_sample(rng, population, cum_weights, k):
+    k = min(k, len(population))
+    if k * 2 > len(population):
+        return rng.sample(population, k)
+    chosen = {}
+    while len(chosen) < k:
+        for item in rng.choices(population, cum_weights=cum_weights,
+                                k=k - len(chosen)):
+            chosen[item] = None
+    return list(chosen)
+
+
+def spread(rng, mean):
+    if mean <= 0:
+        return 0
+    return int(rng.expovariate(1 / mean))
+
+
+class Command(BaseCommand):
+    help = ('Генерирует воспроизводимый набор данных для нагрузочного '
+            'тестирования.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument('--tags', type=int, default=len(TAG_NAMES))
+        parser.add_argument('--follows', type=float, default=15,
+                            help='Среднее число подписок на пользователя')
+        parser.add_argument('--favorites', type=float, default=20,
+                            help='Среднее число избранных рецептов')
+        parser.add_argument('--cart', type=float, default=5,
+                            help='Среднее число рецептов в корзине')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--prefix', default='bench')
+        parser.add_argument('--password', default='bench-password')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.prefix = options['prefix']
+        self.batch_size = options['batch_size']
+        ingredient_ids = list(Ingredient.objects.order_by('id').values_list(
+            'id', flat=True))
+        if not ingredient_ids:
+            raise CommandError('Сначала загрузите ингредиенты командой loader')
+        if options['users'] < 2:
+            raise CommandError('Нужно хотя бы два пользователя')
+        if User.objects.filter(username__startswith=self.prefix).exists():
+            raise CommandError(
+                f'Пользователи с префиксом {self.prefix} уже существуют')
+        started = time.monotonic()
+        with transaction.atomic():
+            tags = self.create_tags(options['tags'])
+            user_ids = self.create_users(options['users'],
+                                         options['password'])
+            author_weights = cumulative_weights(self.rng, len(user_ids))
+            recipes = self.create_recipes(options['recipes'], user_ids,
+                                          author_weights, tags,
+                                          ingredient_ids)
+            recipe_ids = [pk for pk, _ in recipes]
+            follows = self.create_follows(user_ids, author_weights,
+                                          options['follows'])
+            recipe_weights = cumulative_weights(self.rng, len(recipe_ids))
+            self.create_lists(Favorites, user_ids, recipe_ids,
+                              recipe_weights, options['favorites'])
+            self.create_lists(ShoppingCart, user_ids, recipe_ids,
+                              recipe_weights, options['cart'])
+            ShoppingListItem.objects.rebuild(batch_size=self.batch_size)
+            reconcile_counters()
+            self.create_feeds(follows, recipes)
+        print(f'Generation is complete: {len(user_ids)} users, '
+              f'{len(recipes)} recipes, {len(follows)} follows '
+              f'in {time.monotonic() - started:.2f}s.')
+
+    def create_tags(self, count):
+        tags = []
+        for i in range(count):
+            name = (TAG_NAMES[i] if i < len(TAG_NAMES)
+                    else f'{self.prefix} {i}')
+            tag, _ = Tag.objects.get_or_create(name=name, defaults={
+                'slug': f'{self.prefix}-{i}',
+                'color': '#' + hashlib.md5(name.encode()).hexdigest()[:6],
+            })
+            tags.append(tag)
+        return tags
+
+    def create_users(self, count, password):
+        password = make_password(password)
+        rng = self.rng
+        for batch in batches(range(count), self.batch_size):
+            User.objects.bulk_create(
+                User(username=f'{self.prefix}{i}',
+                     email=f'{self.prefix}{i}@example.com',
+                     first_name=rng.choice(FIRST_NAMES),
+                     last_name=rng.choice(LAST_NAMES),
+                     password=password)
+                for i in batch)
+        return list(User.objects.filter(
+            username__startswith=self.prefix).order_by('id').values_list(
+            'id', flat=True))
+
+    def create_recipes(self, count, user_ids, author_weights, tags,
+                       ingredient_ids):
+        rng = self.rng
+        ingredient_weights = list(accumulate(
+            1 / rank for rank in range(1, len(ingredient_ids) + 1)))
+        ingredient_ids = rng.sample(ingredient_ids, len(ingredient_ids))
+        recipes = []
+        for batch in batches(range(count), self.batch_size):
+            rows = {}
+            for i in batch:
+                name = f'{rng.choice(DISHES)} {self.prefix} #{i}'
+                recipe_tags = rng.sample(tags, min(
+                    rng.randint(*TAGS_PER_RECIPE), len(tags)))
+                ingredients = weighted_sample(
+                    rng, ingredient_ids, ingredient_weights,
+                    rng.randint(*INGREDIENTS_PER_RECIPE))
+                rows[name] = (Recipe(
+                    author_id=rng.choices(user_ids,
+                                          cum_weights=author_weights)[0],
+                    name=name,
+                    text=' '.join(rng.choices(
+                        WORDS, k=rng.randint(*TEXT_WORDS))).capitalize(),
+                    cooking_time=rng.randint(*COOKING_TIME),
+                    tags_mask=tags_mask(recipe_tags),
+                ), recipe_tags, ingredients)
+            Recipe.objects.bulk_create(recipe for recipe, _, _
+                                       in rows.values())
+            ids = dict(Recipe.objects.filter(name__in=rows).values_list(
+                'name', 'id'))
+            RecipeTag.objects.bulk_create(
+                RecipeTag(recipe_id=ids[name], tag=tag)
+                for name, (_, recipe_tags, _) in rows.items()
+                for tag in recipe_tags)
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe_id_id=ids[name],
+                                 ingredient_id=ingredient_id,
+                                 amount=rng.randint(*AMOUNT))
+                for name, (_, _, ingredients) in rows.items()
+                for ingredient_id in ingredients)
+            recipes += [(ids[name], recipe.author_id)
+                        for name, (recipe, _, _) in rows.items()]
+        return recipes
+
+    def create_follows(self, user_ids, author_weights, mean):
+        follows = []
+        for user_id in user_ids:
+            authors = weighted_sample(
+                self.rng, user_ids, author_weights,
+                min(spread(self.rng, mean) + 1, len(user_ids) - 1))
+            follows += [(user_id, author_id) for author_id in authors
+                        if author_id != user_id]
+        for batch in batches(follows, self.batch_size):
+            Follow.objects.bulk_create(
+                Follow(user_id=user_id, author_id=author_id)
+                for user_id, author_id in batch)
+        return follows
+
+    def create_lists(self, model, user_ids, recipe_ids, recipe_weights,
+                     mean):
+        rows = [
+            (user_id, recipe_id) for user_id in user_ids
+            for recipe_id in weighted_sample(
+                self.rng, recipe_ids, recipe_weights,
+                spread(self.rng, mean))
+        ]
+        for batch in batches(rows, self.batch_size):
+            model.objects.bulk_create(
+                model(user_id=user_id, recipe_id=recipe_id)
+                for user_id, recipe_id in batch)
+
+    def create_feeds(self, follows, recipes):
+        followers = Counter(author_id for _, author_id in follows)
+        pub_dates = dict(Recipe.objects.filter(
+            author__username__startswith=self.prefix).values_list(
+            'id', 'pub_date'))
+        by_author = defaultdict(list)
+        for pk, author_id in reversed(recipes):
+            if len(by_author[author_id]) < settings.FEED_BACKFILL_SIZE:
+                by_author[author_id].append(pk)
+        entries = (
+            FeedEntry(user_id=user_id, recipe_id=pk, author_id=author_id,
+                      pub_date=pub_dates[pk])
+            for user_id, author_id in follows
+            if followers[author_id] <= settings.FEED_FANOUT_LIMIT
+            for pk in by_author[author_id]
+        )
+        FeedEntry.objects.bulk_create(entries, batch_size=self.batch_size)
@@ -1,18 +1,124 @@
+import csv
+import io
 import json
+import os
+import time
+from itertools import islice
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 from recipes.models import Ingredient
+from recipes.versions import bump_version
+
+DEFAULT_PATH = os.path.join(settings.BASE_DIR, 'data', 'ingredients.json')
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def iter_json(file):
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    for chunk in iter(lambda: file.read(READ_CHUNK_SIZE), ''):
+        buffer += chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if not started and buffer[position:position + 1] == '[':
+                started = True
+                position += 1
+                continue
+            if buffer[position:position + 1] in ('', ']'):
+                break
+            try:
+                value, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break
+            yield value['name'], value['measurement_unit']
+        buffer = buffer[position:]
+    if buffer.strip() not in ('', ']'):
+        raise CommandError('Некорректный JSON в файле ингредиентов')
+
+
+def iter_csv(file):
+    for row in csv.reader(file):
+        if row:
+            yield row[0], row[1]
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
 
 
 class Command(BaseCommand):
-    def handle(self, *args, **kwargs):
-        with open(f'{settings.BASE_DIR}/data/ingredients.json', 'rb') as f:
-            data = json.load(f)
-
-            for value in data:
-                ingredient = Ingredient()
-                ingredient.name = value['name']
-                ingredient.measurement_unit = value['measurement_unit']
-                ingredient.save()
-        print('Loading is complete.')
+    help = 'Загружает ингредиенты из ingredients.json или ingredients.csv.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=DEFAULT_PATH,
+                            help='Путь к файлу .json или .csv')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--no-copy', action='store_true',
+                            help='Не использовать COPY на PostgreSQL')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.isfile(path):
+            raise CommandError(f'Файл {path} не найден')
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in ('.json', '.csv'):
+            raise CommandError('Поддерживаются только файлы .json и .csv')
+        reader = iter_json if extension == '.json' else iter_csv
+        use_copy = (connection.vendor == 'postgresql'
+                    and not options['no_copy'])
+        loader = self.copy_rows if use_copy else self.insert_rows
+        started = time.monotonic()
+        before = Ingredient.objects.count()
+        with open(path, encoding='utf-8', newline='') as file:
+            with transaction.atomic():
+                processed = loader(reader(file), options['batch_size'])
+        bump_version(Ingredient)
+        elapsed = max(time.monotonic() - started, 1e-6)
+        created = Ingredient.objects.count() - before
+        print(f'Loading is complete: {processed} rows processed, '
+              f'{created} created in {elapsed:.2f}s '
+              f'({processed / elapsed:.0f} rows/sec).')
+
+    def insert_rows(self, rows, batch_size):
+        processed = 0
+        for batch in batches(rows, batch_size):
+            Ingredient.objects.bulk_create(
+                [Ingredient(name=name, measurement_unit=unit)
+                 for name, unit in batch],
+                ignore_conflicts=True,
+            )
+            processed += len(batch)
+        return processed
+
+    def copy_rows(self, rows, batch_size):
+        table = Ingredient._meta.db_table
+        processed = 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE ingredient_load '
+                '(name varchar(200), measurement_unit varchar(200)) '
+                'ON COMMIT DROP')
+            for batch in batches(rows, batch_size):
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(batch)
+                buffer.seek(0)
+                cursor.copy_expert(
+                    'COPY ingredient_load (name, measurement_unit) '
+                    'FROM STDIN WITH (FORMAT csv)', buffer)
+                processed += len(batch)
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                f'SELECT DISTINCT name, measurement_unit '
+                f'FROM ingredient_load '
+                f'ON CONFLICT (name, measurement_unit) DO NOTHING')
+        return processed
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from recipes.feed import latest_recipes, make_entries
+from recipes.models import Follow
+
+
+class Command(BaseCommand):
+    help = 'Заполняет ленты подписок последними рецептами авторов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append',
+                            dest='user_ids',
+                            help='id пользователя (можно несколько раз)')
+
+    def handle(self, *args, **options):
+        follows = Follow.objects.all()
+        if options['user_ids']:
+            follows = follows.filter(user_id__in=options['user_ids'])
+        for user_id, author_id in follows.values_list(
+                'user_id', 'author_id').iterator():
+            make_entries([user_id], latest_recipes([author_id]))
+        print('Rebuilding is complete.')
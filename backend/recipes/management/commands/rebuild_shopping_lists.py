@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает сохранённые списки покупок по корзинам.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append',
+                            dest='user_ids',
+                            help='id пользователя (можно несколько раз)')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            ShoppingListItem.objects.rebuild(options['user_ids'])
+        print('Rebuilding is complete.')
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики избранного, покупок, рецептов '
+            'и подписчиков.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            recipes, users = reconcile_counters()
+        print(f'Reconciling is complete: {recipes} recipes, {users} users.')
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.13 on 2026-10-18 19:19
+
+from django.db import migrations, models
+import recipes.storage
+
+
+def reset_image_variants(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Recipe.objects.filter(image_variants_ready=True).update(
+        image_variants_ready=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipe_image_variants_ready'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(blank=True, help_text='Загрузите изображение с фотографией готового блюда', null=True, storage=recipes.storage.ContentAddressedStorage(), upload_to='recipes/images', verbose_name='Картинка'),
+        ),
+        migrations.RunPython(reset_image_variants,
+                             migrations.RunPython.noop),
+    ]
@@ -1,11 +1,19 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .storage import recipe_image_storage
 
 User = get_user_model()
 
 
+MAX_TAGS = 63
+
+
 class Tag(models.Model):
 
     name = models.CharField(
@@ -28,6 +36,11 @@ class Tag(models.Model):
         verbose_name='Идентификатор',
         help_text='Уникальный URL адрес для тега',
     )
+    bit = models.PositiveSmallIntegerField(
+        unique=True,
+        editable=False,
+        verbose_name='Бит в маске тегов',
+    )
 
     class Meta:
         ordering = ('id',)
@@ -37,6 +50,46 @@ class Tag(models.Model):
     def __str__(self):
         return self.name[:30]
 
+    def save(self, *args, **kwargs):
+        if self.bit is not None:
+            return super().save(*args, **kwargs)
+        while True:
+            used = set(Tag.objects.values_list('bit', flat=True))
+            bit = next(
+                (bit for bit in range(MAX_TAGS) if bit not in used), None)
+            if bit is None:
+                raise ValidationError(
+                    f'Нельзя создать больше {MAX_TAGS} тегов')
+            self.bit = bit
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                self.bit = None
+                # Бит успел занять параллельно созданный тег: берём
+                # следующий свободный.
+                if not Tag.objects.filter(bit=bit).exists():
+                    raise
+
+
+class DataVersion(models.Model):
+
+    label = models.CharField(
+        primary_key=True,
+        max_length=100,
+        verbose_name='Модель',
+    )
+    version = models.BigIntegerField(
+        verbose_name='Версия данных',
+    )
+
+    class Meta:
+        verbose_name = 'Версия данных'
+        verbose_name_plural = 'Версии данных'
+
+    def __str__(self):
+        return f'{self.label} - {self.version}'
+
 
 class Ingredient(models.Model):
 
@@ -55,6 +108,10 @@ class Ingredient(models.Model):
         ordering = ('name',)
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = (
+            models.UniqueConstraint(fields=('name', 'measurement_unit'),
+                                    name='unique_ingredient'),
+        )
 
     def __str__(self):
         return f'{self.name} - {self.measurement_unit}'
@@ -77,6 +134,7 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         upload_to='recipes/images',
+        storage=recipe_image_storage,
         max_length=None,
         blank=True,
         null=True,
@@ -106,16 +164,57 @@ class Recipe(models.Model):
         verbose_name='Время приготовления в минутах',
         help_text='Время приготовления в минутах'
     )
+    image_variants_ready = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name='Превью готовы',
+    )
+    tags_mask = models.BigIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Маска тегов',
+    )
     pub_date = models.DateTimeField(auto_now_add=True)
+    version = models.PositiveIntegerField(
+        default=1,
+        editable=False,
+        verbose_name='Версия',
+        help_text='Увеличивается при каждом изменении рецепта',
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном, раз',
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В списках покупок, раз',
+    )
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = (
+            models.Index(fields=('-pub_date', '-id'),
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=('tags_mask',),
+                         name='recipe_tags_mask_idx'),
+        )
 
     def __str__(self):
         return self.name[:30]
 
+    def bump_version(self):
+        Recipe.objects.filter(pk=self.pk).update(
+            version=models.F('version') + 1)
+        self.refresh_from_db(fields=('version',))
+
+
+def tags_mask(tags):
+    return sum(1 << tag.bit for tag in tags)
+
 
 class RecipeTag(models.Model):
 
@@ -258,3 +357,165 @@ class Follow(models.Model):
 
     def __str__(self):
         return f'{self.user.username} - {self.author.username}'
+
+
+class FeedEntry(models.Model):
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Читатель',
+        help_text='Пользователь, в ленте которого рецепт',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор рецепта',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации рецепта',
+    )
+
+    class Meta:
+        ordering = ('-pub_date', '-recipe_id')
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'recipe'),
+                                    name='unique_feed_entry'),
+        )
+        indexes = (
+            models.Index(fields=('user', '-pub_date', '-recipe'),
+                         name='feed_user_pub_date_idx'),
+            models.Index(fields=('user', 'author'),
+                         name='feed_user_author_idx'),
+        )
+
+    def __str__(self):
+        return f'{self.user.username} - {self.recipe.name}'
+
+
+class ShoppingListItemManager(models.Manager):
+
+    def change_amounts(self, user_ids, deltas):
+        deltas = {ingredient_id: delta
+                  for ingredient_id, delta in deltas.items() if delta}
+        if not user_ids or not deltas:
+            return
+        now = timezone.now()
+        # Недостающие строки создаются заранее: параллельная транзакция
+        # упрётся в уникальный индекс, а не создаст дубликат.
+        self.bulk_create(
+            (self.model(user_id=user_id, ingredient_id=ingredient_id,
+                        amount=0, updated=now)
+             for user_id in user_ids
+             for ingredient_id, delta in deltas.items() if delta > 0),
+            ignore_conflicts=True)
+        to_update, to_delete = [], []
+        for item in self.select_for_update().filter(
+                user_id__in=user_ids, ingredient_id__in=deltas).order_by('pk'):
+            item.amount += deltas[item.ingredient_id]
+            item.updated = now
+            if item.amount > 0:
+                to_update.append(item)
+            else:
+                to_delete.append(item.pk)
+        self.bulk_update(to_update, ('amount', 'updated'))
+        if to_delete:
+            self.filter(pk__in=to_delete).delete()
+
+    def add_recipes(self, user, recipe_ids):
+        self.change_amounts([user.pk], recipes_amounts(recipe_ids))
+
+    def remove_recipes(self, user, recipe_ids):
+        self.change_amounts([user.pk], {
+            ingredient_id: -amount
+            for ingredient_id, amount in recipes_amounts(recipe_ids).items()
+        })
+
+    def update_recipe(self, recipe, old_amounts, new_amounts):
+        deltas = {
+            ingredient_id: (new_amounts.get(ingredient_id, 0)
+                            - old_amounts.get(ingredient_id, 0))
+            for ingredient_id in old_amounts.keys() | new_amounts.keys()
+        }
+        user_ids = list(ShoppingCart.objects.filter(
+            recipe=recipe).values_list('user_id', flat=True))
+        self.change_amounts(user_ids, deltas)
+
+    def rebuild(self, user_ids=None, batch_size=1000):
+        items = self.all()
+        carts = RecipeIngredient.objects.filter(
+            recipe_id__cart_recipe__isnull=False)
+        if user_ids is not None:
+            items = items.filter(user_id__in=user_ids)
+            carts = carts.filter(recipe_id__cart_recipe__user__in=user_ids)
+        items.delete()
+        totals = carts.values_list(
+            'recipe_id__cart_recipe__user', 'ingredient'
+        ).annotate(total=Sum('amount')).order_by()
+        now = timezone.now()
+        self.bulk_create(
+            (self.model(user_id=user_id, ingredient_id=ingredient_id,
+                        amount=total, updated=now)
+             for user_id, ingredient_id, total in totals.iterator()),
+            batch_size=batch_size,
+        )
+
+
+def recipe_amounts(recipe):
+    return dict(RecipeIngredient.objects.filter(
+        recipe_id=recipe).values_list('ingredient_id', 'amount'))
+
+
+def recipes_amounts(recipe_ids):
+    return dict(RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids).values_list('ingredient').annotate(
+        total=Sum('amount')).order_by())
+
+
+class ShoppingListItem(models.Model):
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь',
+        help_text='Имя пользователя'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент',
+        help_text='Ингредиент в списке покупок'
+    )
+    amount = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество',
+        help_text='Суммарное количество по рецептам в списке покупок'
+    )
+    updated = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Обновлено',
+    )
+
+    objects = ShoppingListItemManager()
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Список покупок'
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'ingredient'),
+                                    name='unique_shopping_list_item'),
+        )
+
+    def __str__(self):
+        return f'{self.user.username} - {self.ingredient.name}'
@@ -0,0 +1,130 @@
+import re
+from functools import lru_cache
+
+from django.db import OperationalError, connection, connections
+from django.db.models import Q
+
+FTS_TABLE = 'recipes_recipe_fts'
+SEARCH_CONFIG = 'russian'
+
+POSTGRESQL_INSTALL = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    f"""ALTER TABLE recipes_recipe
+        ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(name, '')), 'A')
+            || setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(text, '')),
+                         'B')
+        ) STORED""",
+    """CREATE INDEX IF NOT EXISTS recipes_recipe_search_vector_idx
+        ON recipes_recipe USING GIN (search_vector)""",
+    """CREATE INDEX IF NOT EXISTS recipes_recipe_name_trgm_idx
+        ON recipes_recipe USING GIN (name gin_trgm_ops)""",
+)
+POSTGRESQL_UNINSTALL = (
+    'DROP INDEX IF EXISTS recipes_recipe_name_trgm_idx',
+    'DROP INDEX IF EXISTS recipes_recipe_search_vector_idx',
+    'ALTER TABLE recipes_recipe DROP COLUMN IF EXISTS search_vector',
+)
+SQLITE_INSTALL = (
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai
+        AFTER INSERT ON recipes_recipe BEGIN
+            INSERT INTO {FTS_TABLE} (rowid, name, text)
+            VALUES (new.id, new.name, new.text);
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad
+        AFTER DELETE ON recipes_recipe BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, name, text)
+            VALUES ('delete', old.id, old.name, old.text);
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au
+        AFTER UPDATE OF name, text ON recipes_recipe BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, name, text)
+            VALUES ('delete', old.id, old.name, old.text);
+            INSERT INTO {FTS_TABLE} (rowid, name, text)
+            VALUES (new.id, new.name, new.text);
+        END""",
+)
+SQLITE_UNINSTALL = (
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ai',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_au',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+)
+
+
+def install_search_index(db_connection):
+    with db_connection.cursor() as cursor:
+        if db_connection.vendor == 'postgresql':
+            for statement in POSTGRESQL_INSTALL:
+                cursor.execute(statement)
+        elif db_connection.vendor == 'sqlite':
+            if FTS_TABLE not in db_connection.introspection.table_names(
+                    cursor):
+                try:
+                    cursor.execute(
+                        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                        f"name, text, content='recipes_recipe', "
+                        f"content_rowid='id', tokenize='unicode61')")
+                except OperationalError:
+                    return
+                cursor.execute(
+                    f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) "
+                    f"VALUES ('rebuild')")
+            # Пересоздание таблицы рецептов в SQLite удаляет триггеры,
+            # поэтому они восстанавливаются после каждой миграции.
+            for statement in SQLITE_INSTALL:
+                cursor.execute(statement)
+
+
+def uninstall_search_index(db_connection):
+    statements = {
+        'postgresql': POSTGRESQL_UNINSTALL,
+        'sqlite': SQLITE_UNINSTALL,
+    }.get(db_connection.vendor, ())
+    with db_connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+@lru_cache(maxsize=None)
+def has_fts_table(alias):
+    db_connection = connections[alias]
+    with db_connection.cursor() as cursor:
+        return FTS_TABLE in db_connection.introspection.table_names(cursor)
+
+
+def search_recipes(queryset, query):
+    query = query.strip()
+    if not query:
+        return queryset
+    if connection.vendor == 'postgresql':
+        return queryset.extra(
+            select={'search_rank': (
+                f"ts_rank(recipes_recipe.search_vector, "
+                f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)) "
+                f"+ similarity(recipes_recipe.name, %s)")},
+            select_params=(query, query),
+            where=[(
+                f"(recipes_recipe.search_vector @@ "
+                f"websearch_to_tsquery('{SEARCH_CONFIG}', %s) "
+                f"OR recipes_recipe.name %% %s)")],
+            params=(query, query),
+        ).order_by('-search_rank', '-pub_date')
+    if connection.vendor == 'sqlite' and has_fts_table(connection.alias):
+        tokens = re.findall(r'\w+', query)
+        if not tokens:
+            return queryset.none()
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        return queryset.extra(
+            select={'search_rank': (
+                f'SELECT -bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s '
+                f'AND {FTS_TABLE}.rowid = recipes_recipe.id')},
+            select_params=(match,),
+            where=[(
+                f'recipes_recipe.id IN (SELECT rowid FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s)')],
+            params=(match,),
+        ).order_by('-search_rank', '-pub_date')
+    return queryset.filter(Q(name__icontains=query) | Q(text__icontains=query))
@@ -0,0 +1,180 @@
+from django.contrib.auth import get_user_model
+from django.core.signals import request_started
+from django.db import connections
+from django.db.models import F
+from django.db.models.signals import (post_delete, post_migrate, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from .counters import RECIPE_COUNTERS, change_counter
+from .deletion import deleting, writes_handled
+from .models import (Favorites, Follow, Ingredient, Recipe, RecipeIngredient,
+                     RecipeTag, ShoppingCart, ShoppingListItem, Tag,
+                     recipe_amounts, tags_mask)
+from .search import install_search_index
+from .versions import bump_version, forget_versions
+
+User = get_user_model()
+
+
+@receiver(request_started)
+def reload_versions(**kwargs):
+    forget_versions()
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Tag)
+def bump_reference_version(sender, **kwargs):
+    bump_version(sender)
+
+
+@receiver(post_delete, sender=Tag)
+def clear_tag_bit(sender, instance, **kwargs):
+    Recipe.objects.update(
+        tags_mask=F('tags_mask').bitand(~(1 << instance.bit)))
+
+
+AUTHOR_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+
+
+@receiver(post_save, sender=Recipe)
+def bump_recipe_version(sender, instance, created, **kwargs):
+    if not created:
+        instance.bump_version()
+    elif not writes_handled.get():
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_save, sender=User)
+def bump_version_on_author(sender, instance, created, update_fields,
+                           **kwargs):
+    if created or (update_fields and not AUTHOR_FIELDS & update_fields):
+        return
+    Recipe.objects.filter(author=instance).update(version=F('version') + 1)
+
+
+@receiver(post_migrate)
+def restore_search_index(sender, using, **kwargs):
+    if sender.name == 'recipes':
+        install_search_index(connections[using])
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(sender, instance, created, **kwargs):
+    if created and not writes_handled.get():
+        ShoppingListItem.objects.change_amounts(
+            [instance.user_id], recipe_amounts(instance.recipe_id))
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_shopping_list(sender, instance, **kwargs):
+    if writes_handled.get():
+        return
+    ShoppingListItem.objects.change_amounts([instance.user_id], {
+        ingredient_id: -amount
+        for ingredient_id, amount in recipe_amounts(instance.recipe_id).items()
+    })
+
+
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Favorites)
+def increment_recipe_counter(sender, instance, created, **kwargs):
+    if created and not writes_handled.get():
+        change_counter(Recipe, instance.recipe_id, RECIPE_COUNTERS[sender], 1)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Favorites)
+def decrement_recipe_counter(sender, instance, **kwargs):
+    if not writes_handled.get():
+        change_counter(Recipe, instance.recipe_id, RECIPE_COUNTERS[sender],
+                       -1)
+
+
+@receiver(post_save, sender=Follow)
+def increment_followers_count(sender, instance, created, **kwargs):
+    if created and not writes_handled.get():
+        change_counter(User, instance.author_id, 'followers_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def decrement_followers_count(sender, instance, **kwargs):
+    if not writes_handled.get():
+        change_counter(User, instance.author_id, 'followers_count', -1)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(sender, instance, **kwargs):
+    if not writes_handled.get():
+        change_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+@receiver(pre_delete, sender=Ingredient)
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Recipe)
+def mark_deleting(sender, instance, **kwargs):
+    deleting.set(deleting.get() | {(sender, instance.pk)})
+
+
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Recipe)
+def unmark_deleting(sender, instance, **kwargs):
+    deleting.set(deleting.get() - {(sender, instance.pk)})
+
+
+def bump_recipe(recipe_id):
+    Recipe.objects.filter(pk=recipe_id).update(version=F('version') + 1)
+
+
+def update_tags_mask(recipe_id):
+    tags = Tag.objects.filter(pk__in=RecipeTag.objects.filter(
+        recipe_id=recipe_id).values('tag_id')).only('bit')
+    Recipe.objects.filter(pk=recipe_id).update(
+        version=F('version') + 1, tags_mask=tags_mask(tags))
+
+
+def ingredient_amounts(ingredient):
+    return {ingredient.ingredient_id: ingredient.amount}
+
+
+@receiver(pre_save, sender=RecipeIngredient)
+def remember_ingredient_amount(sender, instance, **kwargs):
+    if writes_handled.get() or instance.pk is None:
+        return
+    instance._old_amounts = dict(RecipeIngredient.objects.filter(
+        pk=instance.pk).values_list('ingredient_id', 'amount'))
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def recipe_ingredient_saved(sender, instance, **kwargs):
+    if writes_handled.get():
+        return
+    ShoppingListItem.objects.update_recipe(
+        instance.recipe_id_id, getattr(instance, '_old_amounts', {}),
+        ingredient_amounts(instance))
+    bump_recipe(instance.recipe_id_id)
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_deleted(sender, instance, **kwargs):
+    if writes_handled.get() or {(Recipe, instance.recipe_id_id), (
+            Ingredient, instance.ingredient_id)} & deleting.get():
+        return
+    ShoppingListItem.objects.update_recipe(
+        instance.recipe_id_id, ingredient_amounts(instance), {})
+    bump_recipe(instance.recipe_id_id)
+
+
+@receiver(post_save, sender=RecipeTag)
+def recipe_tag_saved(sender, instance, **kwargs):
+    if not writes_handled.get():
+        update_tags_mask(instance.recipe_id)
+
+
+@receiver(post_delete, sender=RecipeTag)
+def recipe_tag_deleted(sender, instance, **kwargs):
+    if writes_handled.get() or {(Recipe, instance.recipe_id), (
+            Tag, instance.tag_id)} & deleting.get():
+        return
+    update_tags_mask(instance.recipe_id)
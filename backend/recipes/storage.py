@@ -0,0 +1,53 @@
+import hashlib
+import os
+import posixpath
+from uuid import uuid4
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+CHUNK_SIZE = 64 * 1024
+TEMP_SUFFIX = '.tmp'
+
+
+def file_digest(file):
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in file.chunks(CHUNK_SIZE):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def name_digest(name):
+    return posixpath.splitext(posixpath.basename(name))[0]
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+
+    def hashed_name(self, name, content):
+        directory, filename = posixpath.split(name)
+        digest = file_digest(content)
+        extension = posixpath.splitext(filename)[1].lower()
+        return posixpath.join(directory, digest[:2], digest[2:4],
+                              digest + extension)
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            try:
+                os.utime(self.path(name), None)
+                return name
+            except FileNotFoundError:
+                pass
+        temp_name = super()._save(f'{name}.{uuid4().hex}{TEMP_SUFFIX}',
+                                  content)
+        os.replace(self.path(temp_name), self.path(name))
+        return name
+
+
+recipe_image_storage = ContentAddressedStorage()
@@ -0,0 +1,42 @@
+import threading
+import time
+
+from django.db.models import F
+
+from .models import DataVersion
+
+_local = threading.local()
+
+
+def version_label(model):
+    return model._meta.label_lower
+
+
+def load_versions():
+    versions = getattr(_local, 'versions', None)
+    if versions is None:
+        versions = dict(DataVersion.objects.values_list('label', 'version'))
+        _local.versions = versions
+    return versions
+
+
+def forget_versions():
+    _local.versions = None
+
+
+def get_version(model):
+    versions = load_versions()
+    label = version_label(model)
+    if label not in versions:
+        versions[label] = DataVersion.objects.get_or_create(
+            label=label, defaults={'version': time.time_ns()})[0].version
+    return versions[label]
+
+
+def bump_version(model):
+    label = version_label(model)
+    if not DataVersion.objects.filter(label=label).update(
+            version=F('version') + 1):
+        DataVersion.objects.get_or_create(
+            label=label, defaults={'version': time.time_ns()})
+    forget_versions()
@@ -35,6 +35,18 @@ class User(AbstractUser):
         help_text='Введите фамилию'
     )
 
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество рецептов',
+    )
+
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество подписчиков',
+    )
+
     class Meta:
         ordering = ('-id',)
         verbose_name = 'Пользователь'